@@ -0,0 +1,220 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    def match(words: list[str], keys: list[str]) -> bool:
+        if not words:
+            return not keys
+        if words[0] == "#":
+            return any(match(words[1:], keys[index:]) for index in range(len(keys) + 1))
+        if not keys:
+            return False
+        return (words[0] == "*" or words[0] == keys[0]) and match(words[1:], keys[1:])
+    return match(pattern.split("."), routing_key.split("."))
+
+
+class IncomingMessage:
+    def __init__(self, message, routing_key: str, queue: Optional["Queue"] = None):
+        self.body = message.body
+        self.headers = dict(message.headers or {})
+        self.content_type = message.content_type
+        self.timestamp = message.timestamp
+        self.routing_key = routing_key
+        self.queue = queue
+
+    @asynccontextmanager
+    async def process(self):
+        try:
+            yield
+        except Exception:
+            await self.reject()
+            raise
+
+    async def ack(self):
+        pass
+
+    async def nack(self, requeue: bool = True):
+        if requeue:
+            self.queue.messages.appendleft(self)
+            self.queue.ready.set()
+        else:
+            await self.reject()
+
+    async def reject(self):
+        await self.queue.dead_letter(self, "rejected")
+
+
+class DeclareResult:
+    def __init__(self, message_count: int):
+        self.message_count = message_count
+
+
+class Queue:
+    def __init__(self, broker: "InMemoryBroker", name: str, arguments: Optional[dict] = None):
+        self.broker = broker
+        self.name = name
+        self.arguments = arguments or {}
+        self.messages: deque[IncomingMessage] = deque()
+        self.consumers: dict[str, Callable[[IncomingMessage], Awaitable[None]]] = {}
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.busy = False
+
+    async def declare(self) -> DeclareResult:
+        return DeclareResult(len(self.messages))
+
+    async def bind(self, exchange: "Exchange", routing_key: str):
+        exchange.bindings.append((routing_key, self))
+
+    async def consume(self, callback: Callable[[IncomingMessage], Awaitable[None]], no_ack: bool = False) -> str:
+        tag = f"ctag.{next(self.broker.tags)}"
+        self.consumers[tag] = callback
+        if self.task is None:
+            self.task = asyncio.create_task(self.dispatch())
+        return tag
+
+    async def cancel(self, consumer_tag: str):
+        self.consumers.pop(consumer_tag, None)
+
+    def put(self, message: IncomingMessage):
+        message.queue = self
+        ttl = self.arguments.get("x-message-ttl")
+        if ttl is not None:
+            # Очереди с TTL в бенчмарке только откладывают сообщение (очереди повторов), их никто не читает
+            asyncio.get_running_loop().call_later(
+                ttl / 1000, lambda: asyncio.ensure_future(self.dead_letter(message, "expired"))
+            )
+            return
+        self.messages.append(message)
+        self.ready.set()
+
+    async def dead_letter(self, message: IncomingMessage, reason: str):
+        exchange_name = self.arguments.get("x-dead-letter-exchange")
+        if exchange_name is None:
+            return
+        message.headers["x-death"] = [{"reason": reason, "queue": self.name}]
+        exchange = self.broker.exchanges[exchange_name] if exchange_name else self.broker.default_exchange
+        await exchange.publish(message, self.arguments.get("x-dead-letter-routing-key", message.routing_key))
+
+    async def get(self, no_ack: bool = False, fail: bool = True) -> Optional[IncomingMessage]:
+        if self.messages:
+            return self.messages.popleft()
+        if fail:
+            raise LookupError(f"Queue {self.name} is empty")
+        return None
+
+    async def dispatch(self):
+        # Колбэк консьюмера только ставит задачу (EventConsumer.on_message), поэтому доставка последовательная
+        while True:
+            await self.ready.wait()
+            while self.messages and self.consumers:
+                callback = next(iter(self.consumers.values()))
+                self.busy = True
+                try:
+                    await callback(self.messages.popleft())
+                except Exception as e:
+                    logger.error("Consumer of %s failed: %s", self.name, e)
+                finally:
+                    self.busy = False
+            self.ready.clear()
+
+    def idle(self) -> bool:
+        # Очереди без консьюмеров (припаркованные сообщения) не задерживают завершение сценария
+        return not (self.messages and self.consumers) and not self.busy
+
+
+class Exchange:
+    def __init__(self, name: str, topic: bool):
+        self.name = name
+        self.topic = topic
+        self.bindings: list[tuple[str, Queue]] = []
+        self.published = 0
+
+    async def publish(self, message, routing_key: str):
+        self.published += 1
+        for pattern, queue in self.bindings:
+            if topic_matches(pattern, routing_key) if self.topic else pattern == routing_key:
+                queue.put(IncomingMessage(message, routing_key))
+
+
+class DefaultExchange(Exchange):
+    def __init__(self, broker: "InMemoryBroker"):
+        super().__init__("", topic=False)
+        self.broker = broker
+
+    async def publish(self, message, routing_key: str):
+        self.published += 1
+        queue = self.broker.queues.get(routing_key)
+        if queue is not None:
+            queue.put(IncomingMessage(message, routing_key))
+
+
+class Channel:
+    def __init__(self, broker: "InMemoryBroker"):
+        self.broker = broker
+        self.is_closed = False
+        self.default_exchange = broker.default_exchange
+
+    async def set_qos(self, prefetch_count: int):
+        pass
+
+    async def declare_queue(
+            self,
+            name: Optional[str] = None,
+            durable: bool = False,
+            exclusive: bool = False,
+            arguments: Optional[dict] = None
+    ) -> Queue:
+        name = name or f"amq.gen-{next(self.broker.tags)}"
+        if name not in self.broker.queues:
+            self.broker.queues[name] = Queue(self.broker, name, arguments)
+        return self.broker.queues[name]
+
+    async def declare_exchange(self, name: str, type=None, durable: bool = False) -> Exchange:
+        if name not in self.broker.exchanges:
+            self.broker.exchanges[name] = Exchange(name, topic=True)
+        return self.broker.exchanges[name]
+
+
+class Connection:
+    def __init__(self, broker: "InMemoryBroker"):
+        self.broker = broker
+        self.channels: list[Channel] = []
+
+    async def channel(self, publisher_confirms: bool = False) -> Channel:
+        channel = Channel(self.broker)
+        self.channels.append(channel)
+        return channel
+
+    async def close(self):
+        for channel in self.channels:
+            channel.is_closed = True
+
+
+class InMemoryBroker:
+    """Заменяет aio_pika.connect_robust в бенчмарке: очереди, topic-обменники и доставка внутри процесса."""
+
+    def __init__(self):
+        self.queues: dict[str, Queue] = {}
+        self.exchanges: dict[str, Exchange] = {}
+        self.default_exchange = DefaultExchange(self)
+        self.tags = itertools.count(1)
+
+    async def connect_robust(self, url: str) -> Connection:
+        return Connection(self)
+
+    def idle(self) -> bool:
+        return all(queue.idle() for queue in self.queues.values())
+
+    async def close(self):
+        for queue in self.queues.values():
+            if queue.task:
+                queue.task.cancel()
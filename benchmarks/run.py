@@ -0,0 +1,361 @@
+"""Нагрузочный бенчмарк line_provider и bet_maker в одном процессе.
+
+Оба приложения поднимаются со своими lifespan поверх SQLite (или --db-url) и брокера в памяти вместо RabbitMQ,
+запросы идут напрямую в ASGI без сети. Результаты пишутся в JSON для сравнения запусков между коммитами:
+
+    python benchmarks/run.py --events 1000 --bets 5000 --concurrency 50 --output results.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
+from types import ModuleType
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlencode
+
+from broker import InMemoryBroker
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_ENV = {
+    "LOG_LEVEL": "WARNING",
+    "LOG_ACCESS_SAMPLE_RATE": "0",
+    "SYNC_INTERVAL": "3600",
+    "ACTIVE_EVENTS_REFRESH_INTERVAL": "3600",
+    "OUTBOX_POLL_INTERVAL": "0.05",
+    "CONSUMER_MONITOR_INTERVAL": "1",
+    "DB_POOL_WARM": "1",
+}
+
+
+def load_service(name: str) -> dict[str, ModuleType]:
+    # У сервисов одинаковые имена модулей (main, models, config...), поэтому после импорта
+    # модули сервиса убираются из sys.modules, а ссылки между ними остаются внутри самих модулей
+    path = os.path.join(ROOT, name)
+    cwd = os.getcwd()
+    os.chdir(path)
+    sys.path.insert(0, path)
+    try:
+        importlib.import_module("main")
+    finally:
+        sys.path.remove(path)
+        os.chdir(cwd)
+    modules = {}
+    for module_name, module in list(sys.modules.items()):
+        if (getattr(module, "__file__", None) or "").startswith(path + os.sep):
+            modules[module_name] = sys.modules.pop(module_name)
+    return modules
+
+
+async def asgi_request(app, method: str, path: str, body=None, headers: Optional[dict] = None) -> tuple[int, bytes]:
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    request_headers = [(b"host", b"benchmark"), (b"content-type", b"application/json")]
+    request_headers += [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": request_headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    received = False
+    status = 500
+    chunks = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # ServerErrorMiddleware пробрасывает исключение уже после отправки ответа 500
+        pass
+    return status, b"".join(chunks)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def summary(latencies: list[float], duration: float, count: int, errors: int = 0, **extra) -> dict:
+    return {
+        "count": count,
+        "errors": errors,
+        "duration": round(duration, 6),
+        "throughput": round(count / duration, 2) if duration else 0.0,
+        "mean": round(statistics.fmean(latencies), 6) if latencies else 0.0,
+        "p50": round(percentile(latencies, 0.50), 6),
+        "p95": round(percentile(latencies, 0.95), 6),
+        "p99": round(percentile(latencies, 0.99), 6),
+        **extra,
+    }
+
+
+async def run_concurrently(call: Callable[[int], Awaitable[int]], count: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    indexes = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            started = time.perf_counter()
+            status = await call(index)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summary(latencies, time.perf_counter() - started, count, errors, concurrency=concurrency)
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.broker = InMemoryBroker()
+        self.lp: dict[str, ModuleType] = {}
+        self.bm: dict[str, ModuleType] = {}
+        self.event_ids: list[int] = []
+        self.settle_latencies: list[float] = []
+
+    def boot(self):
+        for key, value in BENCH_ENV.items():
+            os.environ.setdefault(key, value)
+        if self.args.bet_batch_window:
+            os.environ["BET_BATCH_WINDOW"] = str(self.args.bet_batch_window)
+        import aio_pika
+        aio_pika.connect_robust = self.broker.connect_robust
+        self.lp = load_service("line_provider")
+        self.bm = load_service("bet_maker")
+        orm = {
+            "connections": {"default": self.args.db_url},
+            "apps": {
+                "line_provider": {"models": [self.lp["models"]], "default_connection": "default"},
+                "bet_maker": {"models": [self.bm["models"]], "default_connection": "default"},
+            },
+        }
+        self.lp["main"].TORTOISE_ORM = orm
+        self.bm["main"].TORTOISE_ORM = orm
+        self.bm["main"].lp_client.get_json = self.lp_get_json
+        process_message = self.bm["main"].process_message
+
+        async def timed_process_message(message):
+            started = time.perf_counter()
+            await process_message(message)
+            self.settle_latencies.append(time.perf_counter() - started)
+        self.bm["main"].process_message = timed_process_message
+
+    async def lp_get_json(self, path: str, params: Optional[dict] = None):
+        status, body = await asgi_request(self.lp["main"].app, "GET", f"{path}?{urlencode(params or {})}")
+        if status >= 400:
+            raise RuntimeError(f"line_provider returned {status} for {path}")
+        return json.loads(body)
+
+    async def drain(self, timeout: float = 120):
+        # Ждём, пока outbox опустеет, брокер раздаст сообщения, а консьюмеры bet_maker их обработают
+        bm_main = self.bm["main"]
+        deadline = time.perf_counter() + timeout
+        stable = 0
+        while stable < 3:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Benchmark pipeline did not drain")
+            consumers = (bm_main.consumer, bm_main.catalogue_consumer, bm_main.cache_consumer)
+            busy = (
+                await self.lp["models"].OutboxMessage.all().count()
+                or not self.broker.idle()
+                or any(consumer and consumer.tasks for consumer in consumers)
+            )
+            stable = 0 if busy else stable + 1
+            await asyncio.sleep(0.02)
+
+    async def create_events(self) -> dict:
+        lp_app = self.lp["main"].app
+        deadline = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+        created = []
+
+        async def create(index: int) -> int:
+            status, body = await asgi_request(lp_app, "POST", "/events/", {
+                "coefficient": round(self.random.uniform(1.01, 5), 2),
+                "deadline": deadline,
+                "status": self.lp["models"].EventStatus.unfinished.value,
+            })
+            if status < 400:
+                created.append(json.loads(body)["id"])
+            return status
+
+        result = await run_concurrently(create, self.args.events, self.args.concurrency)
+        started = time.perf_counter()
+        await self.drain()
+        result["propagation_seconds"] = round(time.perf_counter() - started, 6)
+        result["cached_in_bet_maker"] = len(self.bm["main"].events_cache.events)
+        self.event_ids = sorted(created)
+        return result
+
+    async def catalogue_sync(self) -> dict:
+        bm_main = self.bm["main"]
+        state = await self.bm["models"].SyncState.get(id=1)
+        state.cursor = 0
+        state.synced_at = None
+        await state.save()
+        started = time.perf_counter()
+        await bm_main.get_actual_events()
+        full = time.perf_counter() - started
+        latencies = []
+        for _ in range(self.args.sync_runs):
+            started = time.perf_counter()
+            await bm_main.get_actual_events()
+            latencies.append(time.perf_counter() - started)
+        result = summary(latencies, sum(latencies), len(latencies))
+        result["full_sync_seconds"] = round(full, 6)
+        result["full_sync_events_per_second"] = round(len(self.event_ids) / full, 2) if full else 0.0
+        return result
+
+    async def place_bets(self) -> dict:
+        bm_app = self.bm["main"].app
+        bets = [
+            {"lp_id": self.random.choice(self.event_ids), "amount": round(self.random.uniform(1, 1000), 2)}
+            for _ in range(self.args.bets)
+        ]
+
+        async def place(index: int) -> int:
+            status, _ = await asgi_request(bm_app, "POST", "/bet", bets[index])
+            return status
+
+        return await run_concurrently(place, len(bets), self.args.concurrency)
+
+    async def list_endpoints(self) -> dict:
+        endpoints = [
+            ("line_provider", "/actual_events/"),
+            ("line_provider", "/events/?limit=1000"),
+            ("bet_maker", "/events/?limit=1000"),
+            ("bet_maker", "/bets?limit=1000"),
+        ]
+        results = {}
+        for service, path in endpoints:
+            app = (self.lp if service == "line_provider" else self.bm)["main"].app
+
+            async def fetch(index: int, app=app, path=path) -> int:
+                status, _ = await asgi_request(app, "GET", path)
+                return status
+
+            results[f"{service} GET {path}"] = await run_concurrently(
+                fetch, self.args.list_requests, self.args.concurrency
+            )
+        return results
+
+    async def settlement(self) -> dict:
+        settled_events = self.event_ids[:self.args.settle_events]
+        EventStatus = self.lp["models"].EventStatus
+        statuses = (EventStatus.win_team_one.value, EventStatus.win_team_two.value)
+        Bet = self.bm["models"].Bet
+        bets = await Bet.filter(lp_id__in=settled_events).count()
+        self.settle_latencies.clear()
+        started = time.perf_counter()
+        for offset in range(0, len(settled_events), 1000):
+            await asgi_request(self.lp["main"].app, "PUT", "/events/status", [
+                {"id": event_id, "status": self.random.choice(statuses)}
+                for event_id in settled_events[offset:offset + 1000]
+            ])
+        await self.drain()
+        duration = time.perf_counter() - started
+        pending = await Bet.filter(lp_id__in=settled_events, status=self.bm["models"].BetStatus.pending).count()
+        result = summary(self.settle_latencies, duration, len(self.settle_latencies), errors=pending)
+        result["bets_settled"] = bets - pending
+        result["bets_per_second"] = round((bets - pending) / duration, 2) if duration else 0.0
+        return result
+
+    async def run(self) -> dict:
+        self.boot()
+        lp_main, bm_main = self.lp["main"], self.bm["main"]
+        tortoise = importlib.import_module("tortoise")
+        await tortoise.Tortoise.init(config=lp_main.TORTOISE_ORM)
+        await tortoise.Tortoise.generate_schemas()
+        results = {}
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(lp_main.app.router.lifespan_context(lp_main.app))
+            await stack.enter_async_context(bm_main.app.router.lifespan_context(bm_main.app))
+            stack.push_async_callback(self.broker.close)
+            await self.drain()
+            results["event_creation"] = await self.create_events()
+            results["catalogue_sync"] = await self.catalogue_sync()
+            results["bet_placement"] = await self.place_bets()
+            results["list_endpoints"] = await self.list_endpoints()
+            results["settlement"] = await self.settlement()
+        return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of line_provider and bet_maker")
+    parser.add_argument("--events", type=int, default=1000, help="Synthetic catalogue size")
+    parser.add_argument("--bets", type=int, default=5000, help="Bets to place")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent in-flight requests")
+    parser.add_argument("--list-requests", type=int, default=200, help="Requests per list endpoint")
+    parser.add_argument("--sync-runs", type=int, default=50, help="Incremental catalogue sync passes")
+    parser.add_argument("--settle-events", type=int, default=100, help="Events to finish and settle")
+    parser.add_argument("--bet-batch-window", type=float, default=0, help="BET_BATCH_WINDOW for bet_maker")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-url", default=None, help="Tortoise DB URL, a temporary SQLite file by default")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+    if args.db_url is None:
+        args.db_url = f"sqlite://{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.sqlite3')}"
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = asyncio.run(Benchmark(args).run())
+    report = {
+        "commit": git_commit(),
+        "started_at": started_at,
+        "python": platform.python_version(),
+        "params": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Микробенчмарк сериализации списочных эндпоинтов.
+
+Сравнивает прежний путь (объекты ORM -> модели Pydantic -> проверка response_model -> JSONResponse)
+с быстрым (строки .values() -> orjson через FastJSONResponse) на одной и той же выборке и проверяет,
+что JSON получается одинаковым:
+
+    python benchmarks/serialization.py --rows 1000 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Awaitable, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import Response
+from tortoise import Tortoise
+
+from run import BENCH_ENV, load_service
+
+
+async def measure(render: Callable[[], Awaitable[Response]], repeat: int) -> tuple[dict, bytes]:
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = (await render()).body
+        timings.append(time.perf_counter() - started)
+    return {
+        "mean": round(statistics.fmean(timings), 6),
+        "min": round(min(timings), 6),
+        "bytes": len(body),
+    }, body
+
+
+async def legacy_response(model_type, objects: list) -> JSONResponse:
+    # Так ответ собирал FastAPI: модель на строку, затем повторная валидация через response_model
+    field = create_response_field(name="response", type_=list[model_type])
+    content = await serialize_response(field=field, response_content=objects)
+    return JSONResponse(content)
+
+
+async def compare(name: str, legacy: Callable[[], Awaitable[Response]], fast: Callable[[], Awaitable[Response]],
+                  repeat: int) -> dict:
+    legacy_stats, legacy_body = await measure(legacy, repeat)
+    fast_stats, fast_body = await measure(fast, repeat)
+    if json.loads(legacy_body) != json.loads(fast_body):
+        raise AssertionError(f"{name}: fast path output differs from the legacy response")
+    return {
+        "legacy": legacy_stats,
+        "fast": fast_stats,
+        "speedup": round(legacy_stats["mean"] / fast_stats["mean"], 2),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    lp = load_service("line_provider")
+    bm = load_service("bet_maker")
+    await Tortoise.init(config={
+        "connections": {"default": "sqlite://:memory:"},
+        "apps": {
+            "line_provider": {"models": [lp["models"]], "default_connection": "default"},
+            "bet_maker": {"models": [bm["models"]], "default_connection": "default"},
+        },
+    })
+    await Tortoise.generate_schemas()
+    rnd = random.Random(args.seed)
+    Event, EventStatus = lp["models"].Event, lp["models"].EventStatus
+    Bet, BetStatus = bm["models"].Bet, bm["models"].BetStatus
+    deadline = datetime.now(timezone.utc) + timedelta(hours=1)
+    await Event.bulk_create([
+        Event(
+            coefficient=Decimal(f"{rnd.uniform(1.01, 5):.2f}"),
+            deadline=deadline + timedelta(seconds=index),
+            status=rnd.choice(list(EventStatus)),
+            version=index + 1
+        ) for index in range(args.rows)
+    ])
+    await Bet.bulk_create([
+        Bet(
+            lp_id=index % 100 + 1,
+            amount=Decimal(f"{rnd.uniform(1, 1000):.2f}"),
+            coefficient=Decimal(f"{rnd.uniform(1.01, 5):.2f}"),
+            status=rnd.choice(list(BetStatus))
+        ) for index in range(args.rows)
+    ])
+    lp_schemas, bm_schemas = lp["schemas"], bm["schemas"]
+    rows_response = lp["pagination"].rows_response
+    event_fields = ("id", "coefficient", "deadline", "status")
+    bet_fields = ("id", "lp_id", "amount", "coefficient", "status", "payout")
+
+    async def legacy_events() -> JSONResponse:
+        events = await Event.all().order_by("id").limit(args.rows)
+        return await legacy_response(lp_schemas.EventOut, [
+            lp_schemas.EventOut(
+                id=event.id,
+                coefficient=event.coefficient,
+                deadline=event.deadline,
+                status=event.status
+            ) for event in events
+        ])
+
+    async def fast_events() -> Response:
+        return rows_response(await Event.all().order_by("id").limit(args.rows).values(*event_fields), args.rows)
+
+    async def legacy_bets() -> JSONResponse:
+        bets = await Bet.all().order_by("id").limit(args.rows)
+        return await legacy_response(bm_schemas.BetOut, [bm["main"].bet_out(bet) for bet in bets])
+
+    async def fast_bets() -> Response:
+        return rows_response(await Bet.all().order_by("id").limit(args.rows).values(*bet_fields), args.rows)
+
+    try:
+        return {
+            "line_provider /events/": await compare("events", legacy_events, fast_events, args.repeat),
+            "bet_maker /bets": await compare("bets", legacy_bets, fast_bets, args.repeat),
+        }
+    finally:
+        await Tortoise.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs fast-path JSON serialization of list endpoints")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per response page")
+    parser.add_argument("--repeat", type=int, default=50, help="Responses rendered per path")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Проверка, что горячие запросы идут по индексам, а не полным сканированием таблицы.
+
+Планы снимаются через EXPLAIN QUERY PLAN на SQLite в памяти:
+
+    python -m pytest benchmarks/test_query_plans.py
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+from tortoise.queryset import QuerySet
+
+from run import BENCH_ENV, load_service
+
+
+async def query_plan(queryset: QuerySet) -> list[str]:
+    client = queryset.model._meta.db
+    rows = await client.execute_query_dict(f"EXPLAIN QUERY PLAN {queryset.sql()}")
+    return [row["detail"] for row in rows]
+
+
+async def collect_plans() -> dict[str, tuple[list[str], str]]:
+    lp = load_service("line_provider")
+    bm = load_service("bet_maker")
+    await Tortoise.init(config={
+        "connections": {"default": "sqlite://:memory:"},
+        "apps": {
+            "line_provider": {"models": [lp["models"]], "default_connection": "default"},
+            "bet_maker": {"models": [bm["models"]], "default_connection": "default"},
+        },
+    })
+    try:
+        await Tortoise.generate_schemas()
+        Event, EventStatus = lp["models"].Event, lp["models"].EventStatus
+        Bet, BetStatus, ActualEvents = bm["models"].Bet, bm["models"].BetStatus, bm["models"].ActualEvents
+        # Рядом с планом - условие, которое индекс должен покрыть целиком
+        return {
+            "bets by event and status": (
+                await query_plan(Bet.filter(lp_id=1, status=BetStatus.pending)), "(lp_id=? AND status=?)"
+            ),
+            # get_or_none строит тот же запрос с LIMIT
+            "actual event by lp_id": (await query_plan(ActualEvents.filter(lp_id=1).limit(2)), "(lp_id=?)"),
+            "active events": (
+                await query_plan(Event.filter(status=EventStatus.unfinished, deadline__gt=datetime.now(timezone.utc))),
+                "(status=? AND deadline>?)"
+            ),
+        }
+    finally:
+        await Tortoise.close_connections()
+
+
+def test_hot_queries_use_indexes():
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    plans = asyncio.run(collect_plans())
+    for name, (plan, condition) in plans.items():
+        assert any(
+            ("USING INDEX" in step or "USING COVERING INDEX" in step) and condition in step for step in plan
+        ), f"{name}: {plan}"
+        assert not any(step.startswith("SCAN") for step in plan), f"{name}: {plan}"
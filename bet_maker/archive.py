@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from tortoise.transactions import in_transaction
+
+import metrics
+from catalogue import purge_tombstones
+from models import ArchivedBet, Bet, BetStatus, EventExposure
+
+
+logger = logging.getLogger(__name__)
+
+SETTLED = (BetStatus.won, BetStatus.lost)
+BET_FIELDS = ("id", "lp_id", "amount", "coefficient", "status", "payout", "idempotency_key")
+
+bets_archived = metrics.counter("bets_archived_total", "Settled bets moved from bets to bets_archive")
+archive_batch_duration = metrics.histogram("archive_batch_duration_seconds", "Duration of one archival batch")
+
+
+class BetArchiver:
+    def __init__(self, age: float, interval: float, batch_size: int, pause: float):
+        self.age = age
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def run(self):
+        while True:
+            try:
+                await self.archive()
+            except Exception as e:
+                logger.error("Failed to archive settled bets: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def archive(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.age)
+        lp_ids = await EventExposure.filter(
+            status__in=SETTLED, settled_at__lt=cutoff, archived_at=None
+        ).order_by("settled_at").values_list("lp_id", flat=True)
+        archived = 0
+        for lp_id in lp_ids:
+            archived += await self.archive_event(lp_id)
+        if archived:
+            logger.info("Archived %s settled bets of %s events", archived, len(lp_ids))
+        purged = await purge_tombstones(cutoff)
+        if purged:
+            logger.info("Purged %s closed events from actual_events", purged)
+        return archived
+
+    async def archive_event(self, lp_id: int) -> int:
+        archived = 0
+        while True:
+            moved = await self.move_batch(lp_id)
+            archived += moved
+            if moved < self.batch_size:
+                break
+            # Пауза между пачками оставляет пул соединений и блокировки строк запросам
+            await asyncio.sleep(self.pause)
+        await EventExposure.filter(lp_id=lp_id).update(archived_at=datetime.now(timezone.utc))
+        return archived
+
+    async def move_batch(self, lp_id: int) -> int:
+        started = time.perf_counter()
+        async with in_transaction():
+            rows = await Bet.filter(lp_id=lp_id, status__in=SETTLED).order_by("id").limit(
+                self.batch_size
+            ).values(*BET_FIELDS)
+            if not rows:
+                return 0
+            archived_at = datetime.now(timezone.utc)
+            await ArchivedBet.bulk_create([ArchivedBet(**row, archived_at=archived_at) for row in rows])
+            await Bet.filter(id__in=[row["id"] for row in rows]).delete()
+        archive_batch_duration.observe(time.perf_counter() - started)
+        bets_archived.inc(len(rows))
+        return len(rows)
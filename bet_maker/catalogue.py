@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from tortoise.transactions import in_transaction
+
+from models import ActualEvents
+
+
+logger = logging.getLogger(__name__)
+
+# Все записи в actual_events идут из процесса-лидера (консьюмеры каталога и расчётов, синхронизация),
+# блокировка делает сравнение версий и запись атомарными. Берётся до открытия транзакции
+write_lock = asyncio.Lock()
+
+
+def is_newer(change: ActualEvents, known_version: int, known_closed: bool) -> bool:
+    # Закрытие применяется и на той же версии: истечение дедлайна публикуется без смены версии
+    if change.closed_at is not None:
+        return not known_closed and change.version >= known_version
+    return change.version > known_version
+
+
+async def apply_changes(changes: list[ActualEvents]) -> list[ActualEvents]:
+    latest: dict[int, ActualEvents] = {}
+    for change in changes:
+        if change.lp_id not in latest or change.version > latest[change.lp_id].version:
+            latest[change.lp_id] = change
+    if not latest:
+        return []
+    async with write_lock, in_transaction():
+        known = {
+            lp_id: (version, closed_at is not None)
+            for lp_id, version, closed_at in await ActualEvents.filter(
+                lp_id__in=list(latest)
+            ).values_list("lp_id", "version", "closed_at")
+        }
+        fresh = [change for change in latest.values() if is_newer(change, *known.get(change.lp_id, (-1, False)))]
+        if fresh:
+            await ActualEvents.bulk_create(
+                fresh,
+                on_conflict=["lp_id"],
+                update_fields=["coefficient", "deadline", "version", "closed_at"]
+            )
+    if len(fresh) < len(changes):
+        logger.info("Skipped %s stale catalogue changes", len(changes) - len(fresh))
+    return fresh
+
+
+async def close_events(versions: dict[int, int]) -> list[int]:
+    # Закрытие без данных события (расчёт, истёкший дедлайн): версия не меньше уже известной
+    if not versions:
+        return []
+    async with write_lock, in_transaction():
+        known = {
+            lp_id: (version, closed_at is not None)
+            for lp_id, version, closed_at in await ActualEvents.filter(
+                lp_id__in=list(versions)
+            ).values_list("lp_id", "version", "closed_at")
+        }
+        closed_at = datetime.now(timezone.utc)
+        tombstones = [
+            ActualEvents(lp_id=lp_id, coefficient=0, version=max(version, known.get(lp_id, (0,))[0]), closed_at=closed_at)
+            for lp_id, version in versions.items()
+            if not known.get(lp_id, (0, False))[1]
+        ]
+        if tombstones:
+            await ActualEvents.bulk_create(tombstones, on_conflict=["lp_id"], update_fields=["version", "closed_at"])
+    return [tombstone.lp_id for tombstone in tombstones]
+
+
+async def purge_tombstones(before: datetime) -> int:
+    # К этому времени запоздавшие сообщения о событии уже не приходят
+    async with write_lock:
+        return await ActualEvents.filter(closed_at__lt=before).delete()
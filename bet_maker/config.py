@@ -12,9 +12,70 @@ db_user = os.getenv("DB_USER", "root")
 db_pass = os.getenv("DB_PASS", "12451245")
 db_name = os.getenv("DB_NAME", "bet_maker")
 db_port = os.getenv("DB_PORT", "3306")
+db_charset = os.getenv("DB_CHARSET", "utf8mb4")
+db_pool_min = int(os.getenv("DB_POOL_MIN", "5"))
+db_pool_max = int(os.getenv("DB_POOL_MAX", "20"))
+db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+db_pool_warm = int(os.getenv("DB_POOL_WARM", str(db_pool_min)))
+db_connect_timeout = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+db_statement_timeout = float(os.getenv("DB_STATEMENT_TIMEOUT", "30"))
+
+app_env = os.getenv("APP_ENV", "development")
 
 mq_user = os.getenv("MQ_USER", "guest")
 mq_pwd = os.getenv("MQ_PWD", "guest")
 mq_host = os.getenv("MQ_HOST", "127.0.0.1")
 
 lp_host = os.getenv("LP_HOST", "localhost")
+
+sync_interval = float(os.getenv("SYNC_INTERVAL", "60"))
+sync_batch_size = int(os.getenv("SYNC_BATCH_SIZE", "1000"))
+
+lp_url = os.getenv("LP_URL", f"http://{lp_host}:8001")
+lp_timeout = float(os.getenv("LP_TIMEOUT", "3"))
+lp_retries = int(os.getenv("LP_RETRIES", "3"))
+lp_retry_backoff = float(os.getenv("LP_RETRY_BACKOFF", "0.2"))
+lp_pool_size = int(os.getenv("LP_POOL_SIZE", "10"))
+
+settle_chunk_size = int(os.getenv("SETTLE_CHUNK_SIZE", "0"))
+
+mq_prefetch = int(os.getenv("MQ_PREFETCH", "50"))
+consumer_concurrency = int(os.getenv("CONSUMER_CONCURRENCY", "10"))
+consumer_drain_timeout = float(os.getenv("CONSUMER_DRAIN_TIMEOUT", "30"))
+consumer_monitor_interval = float(os.getenv("CONSUMER_MONITOR_INTERVAL", "5"))
+
+catalogue_exchange = os.getenv("CATALOGUE_EXCHANGE", "event_catalogue")
+catalogue_queue = os.getenv("CATALOGUE_QUEUE", "bet_maker_catalogue")
+
+bet_batch_window = float(os.getenv("BET_BATCH_WINDOW", "0"))
+bet_batch_max_size = int(os.getenv("BET_BATCH_MAX_SIZE", "500"))
+
+loop_monitor_interval = float(os.getenv("LOOP_MONITOR_INTERVAL", "1"))
+
+role = os.getenv("ROLE", "all")
+workers = int(os.getenv("WORKERS", "1"))
+port = int(os.getenv("PORT", "8002"))
+leader_retry_interval = float(os.getenv("LEADER_RETRY_INTERVAL", "5"))
+generate_schemas = os.getenv("GENERATE_SCHEMAS", "false" if app_env == "production" else "true").lower() == "true"
+
+health_check_timeout = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+sync_stale_after = float(os.getenv("SYNC_STALE_AFTER", str(sync_interval * 3)))
+admission_db_waiters = int(os.getenv("ADMISSION_DB_WAITERS", str(db_pool_max)))
+admission_backlog = int(os.getenv("ADMISSION_BACKLOG", "10000"))
+admission_retry_after = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+stream_queue_size = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))
+stream_keepalive = float(os.getenv("STREAM_KEEPALIVE", "15"))
+stream_exchange = os.getenv("STREAM_EXCHANGE", "bet_maker_stream")
+
+status_dead_letter_exchange = os.getenv("STATUS_DEAD_LETTER_EXCHANGE", "event_status_updates.dlx")
+status_retry_max_attempts = int(os.getenv("STATUS_RETRY_MAX_ATTEMPTS", "5"))
+status_retry_base_delay = float(os.getenv("STATUS_RETRY_BASE_DELAY", "1"))
+status_retry_max_delay = float(os.getenv("STATUS_RETRY_MAX_DELAY", "60"))
+
+# Ставки рассчитанных событий старше ARCHIVE_AFTER секунд уходят в bets_archive; ключ идемпотентности
+# проверяется только по горячей таблице, поэтому возраст архивации должен быть больше окна повторов клиентов
+archive_after = float(os.getenv("ARCHIVE_AFTER", str(7 * 24 * 3600)))
+archive_interval = float(os.getenv("ARCHIVE_INTERVAL", "300"))
+archive_batch_size = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+archive_batch_pause = float(os.getenv("ARCHIVE_BATCH_PAUSE", "0.2"))
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import timezone
+from typing import Awaitable, Callable, Optional
+
+import aio_pika
+
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def message_key(message: aio_pika.IncomingMessage):
+    try:
+        return json.loads(message.body).get("event_id")
+    except (ValueError, AttributeError):
+        return None
+
+
+class EventConsumer:
+    def __init__(
+            self,
+            handler: Callable[[aio_pika.IncomingMessage], Awaitable[None]],
+            concurrency: int,
+            monitor_interval: float = 5
+    ):
+        self.handler = handler
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.monitor_interval = monitor_interval
+        self.tasks: set[asyncio.Task] = set()
+        self.event_locks: dict = {}
+        self.event_waiters: dict = {}
+        self.queue: Optional[aio_pika.Queue] = None
+        self.consumer_tag: Optional[str] = None
+        self.monitor_task: Optional[asyncio.Task] = None
+        self.queue_depth = 0
+        self.processing_lag = 0.0
+        self.processed_total = 0
+        self.failed_total = 0
+
+    async def start(self, queue: aio_pika.Queue):
+        self.queue = queue
+        self.consumer_tag = await queue.consume(self.on_message, no_ack=False)
+        self.monitor_task = asyncio.create_task(self.monitor())
+
+    async def stop(self, timeout: float):
+        if self.queue and self.consumer_tag:
+            await self.queue.cancel(self.consumer_tag)
+            self.consumer_tag = None
+        if self.monitor_task:
+            self.monitor_task.cancel()
+        if self.tasks:
+            logger.info("Waiting for %s in-flight messages", len(self.tasks))
+            done, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning("Cancelled %s messages that did not finish in %ss", len(pending), timeout)
+
+    async def on_message(self, message: aio_pika.IncomingMessage):
+        task = asyncio.create_task(self.run(message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, message: aio_pika.IncomingMessage):
+        # Сообщения одного события обрабатываются строго по очереди, разных событий - параллельно
+        key = message_key(message)
+        lock = self.event_locks.setdefault(key, asyncio.Lock())
+        self.event_waiters[key] = self.event_waiters.get(key, 0) + 1
+        queue_name = self.queue.name if self.queue else ""
+        try:
+            async with lock, self.semaphore:
+                with metrics.mq_consume_duration.time(queue=queue_name):
+                    await self.handler(message)
+            self.processed_total += 1
+            metrics.mq_consumed.inc(queue=queue_name, outcome="ok")
+        except Exception as e:
+            self.failed_total += 1
+            metrics.mq_consumed.inc(queue=queue_name, outcome="failed")
+            logger.error("Failed to process message for event %s: %s", key, e)
+        finally:
+            self.event_waiters[key] -= 1
+            if not self.event_waiters[key]:
+                del self.event_waiters[key]
+                del self.event_locks[key]
+            if message.timestamp:
+                sent_at = message.timestamp
+                if sent_at.tzinfo is None:
+                    sent_at = sent_at.replace(tzinfo=timezone.utc)
+                self.processing_lag = max(time.time() - sent_at.timestamp(), 0.0)
+
+    async def monitor(self):
+        while True:
+            try:
+                declared = await self.queue.declare()
+                self.queue_depth = declared.message_count
+            except Exception as e:
+                logger.warning("Failed to read queue depth: %s", e)
+            await asyncio.sleep(self.monitor_interval)
+
+    def gauges(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": len(self.tasks),
+            "processing_lag": self.processing_lag,
+            "processed_total": self.processed_total,
+            "failed_total": self.failed_total,
+        }
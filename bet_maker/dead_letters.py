@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+import aio_pika
+
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+ATTEMPTS_HEADER = "x-attempts"
+REASON_HEADER = "x-failure-reason"
+FAILED_AT_HEADER = "x-failed-at"
+MAX_REASON_LENGTH = 1000
+
+# Ошибки в самом сообщении (битый JSON, неожиданная структура): повтор ничего не изменит
+POISON_ERRORS = (ValueError, TypeError, KeyError, AttributeError)
+
+retried = metrics.counter("mq_retried_total", "Messages sent to a delayed retry queue", ("queue",))
+parked = metrics.counter("mq_parked_total", "Messages parked in the dead-letter queue", ("queue", "reason"))
+replayed = metrics.counter("mq_replayed_total", "Parked messages replayed to the work queue", ("queue",))
+
+
+def failure_reason(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"[:MAX_REASON_LENGTH]
+
+
+class DeadLetters:
+    # Неудачное сообщение ждёт в очереди повтора с TTL, по истечении которого брокер возвращает его в рабочую
+    # очередь. На каждую задержку своя очередь, поэтому короткие повторы не стоят за длинными. Ошибки
+    # в содержимом и исчерпанные попытки паркуются с причиной через dead-letter exchange, куда брокер
+    # отправляет и сообщения, отклонённые рабочей очередью
+
+    def __init__(self, queue: str, exchange: str, max_attempts: int, base_delay: float, max_delay: float):
+        self.queue = queue
+        self.exchange_name = exchange
+        self.parked_queue = f"{queue}.parked"
+        self.max_attempts = max_attempts
+        self.delays = [min(base_delay * 2 ** attempt, max_delay) for attempt in range(max(max_attempts - 1, 0))]
+        self.channel: Optional[aio_pika.Channel] = None
+        self.exchange: Optional[aio_pika.Exchange] = None
+        self.lock = asyncio.Lock()
+
+    def retry_queue(self, attempt: int) -> str:
+        return f"{self.queue}.retry.{int(self.delays[attempt - 1] * 1000)}ms"
+
+    async def declare(self, channel: aio_pika.Channel) -> aio_pika.Queue:
+        self.channel = channel
+        self.exchange = await channel.declare_exchange(self.exchange_name, aio_pika.ExchangeType.DIRECT, durable=True)
+        parked_queue = await channel.declare_queue(self.parked_queue, durable=True)
+        await parked_queue.bind(self.exchange, routing_key=self.queue)
+        for attempt in range(1, len(self.delays) + 1):
+            await channel.declare_queue(self.retry_queue(attempt), durable=True, arguments={
+                "x-message-ttl": int(self.delays[attempt - 1] * 1000),
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": self.queue,
+            })
+        return await channel.declare_queue(self.queue, durable=True, arguments={
+            "x-dead-letter-exchange": self.exchange_name,
+        })
+
+    @staticmethod
+    def copy(message: aio_pika.IncomingMessage, headers: dict) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=message.body,
+            headers=headers,
+            content_type=message.content_type,
+            timestamp=message.timestamp,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+        )
+
+    async def retry_or_park(self, message: aio_pika.IncomingMessage, error: Exception):
+        # Вызывается внутри message.process(): если публикация не удалась, сообщение будет отклонено
+        # и всё равно попадёт в парковку через dead-letter exchange рабочей очереди
+        attempts = int((message.headers or {}).get(ATTEMPTS_HEADER, 0)) + 1
+        reason = failure_reason(error)
+        if isinstance(error, POISON_ERRORS) or attempts >= self.max_attempts:
+            await self.park(message, attempts, reason)
+            parked.inc(queue=self.queue, reason=type(error).__name__)
+            logger.error("Parked message from %s after %s attempts: %s", self.queue, attempts, reason)
+            return
+        await self.channel.default_exchange.publish(
+            self.copy(message, {**(message.headers or {}), ATTEMPTS_HEADER: attempts, REASON_HEADER: reason}),
+            routing_key=self.retry_queue(attempts)
+        )
+        retried.inc(queue=self.queue)
+        logger.warning("Retrying message from %s in %ss (attempt %s of %s): %s",
+                       self.queue, self.delays[attempts - 1], attempts, self.max_attempts, reason)
+
+    async def park(self, message: aio_pika.IncomingMessage, attempts: int, reason: str):
+        await self.exchange.publish(
+            self.copy(message, {
+                **(message.headers or {}),
+                ATTEMPTS_HEADER: attempts,
+                REASON_HEADER: reason,
+                FAILED_AT_HEADER: datetime.now(timezone.utc).isoformat()
+            }),
+            routing_key=self.queue
+        )
+
+    @staticmethod
+    def describe(message: aio_pika.IncomingMessage) -> dict:
+        headers = message.headers or {}
+        reason = headers.get(REASON_HEADER)
+        if reason is None and headers.get("x-death"):
+            # Отклонено брокером мимо retry_or_park, причину знает только x-death
+            reason = f"dead-lettered: {headers['x-death'][0].get('reason')}"
+        return {
+            "body": message.body.decode("utf-8", errors="replace"),
+            "reason": reason if isinstance(reason, str) else (reason or b"").decode("utf-8", errors="replace"),
+            "attempts": int(headers.get(ATTEMPTS_HEADER, 0)),
+            "failed_at": headers.get(FAILED_AT_HEADER),
+        }
+
+    async def fetch(self, limit: int) -> list[aio_pika.IncomingMessage]:
+        queue = await self.channel.declare_queue(self.parked_queue, durable=True)
+        messages = []
+        while len(messages) < limit:
+            message = await queue.get(no_ack=False, fail=False)
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    async def inspect(self, limit: int) -> list[dict]:
+        # Сообщения читаются без подтверждения и сразу возвращаются в очередь на прежние места
+        async with self.lock:
+            messages = await self.fetch(limit)
+            try:
+                return [self.describe(message) for message in messages]
+            finally:
+                for message in messages:
+                    await message.nack(requeue=True)
+
+    async def replay(self, limit: int) -> int:
+        async with self.lock:
+            messages = await self.fetch(limit)
+            count = 0
+            for message in messages:
+                try:
+                    # История отказов сбрасывается: повтор после исправления получает полный набор попыток
+                    await self.channel.default_exchange.publish(
+                        self.copy(message, {}),
+                        routing_key=self.queue
+                    )
+                except Exception:
+                    for rest in messages[count:]:
+                        await rest.nack(requeue=True)
+                    raise
+                await message.ack()
+                count += 1
+            replayed.inc(count, queue=self.queue)
+            logger.info("Replayed %s parked messages to %s", count, self.queue)
+            return count
@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, NamedTuple, Optional
+
+from models import ActualEvents
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedEvent(NamedTuple):
+    lp_id: int
+    coefficient: Decimal
+    deadline: Optional[datetime]
+    version: int = 0
+
+
+class ActualEventsCache:
+    def __init__(self, on_change: Optional[Callable[[str, int, Optional[CachedEvent]], None]] = None):
+        # Вызывается при появлении события (created), смене коэффициента (coefficient_changed) и закрытии (closed)
+        self.on_change = on_change
+        self.events: dict[int, CachedEvent] = {}
+        # Версии закрытых событий: запоздавшее сообщение каталога не должно вернуть событие в кэш
+        self.closed: dict[int, int] = {}
+        # Закрытые события, которые были в базе при последней загрузке
+        self.tombstones: set[int] = set()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    async def load(self):
+        # Снимок базы сливается с кэшем по версиям, а не заменяет его: таблицу пишет лидер из своей очереди
+        # и позже, чем этот процесс получает те же изменения из эксклюзивной очереди каталога
+        rows = await ActualEvents.all().values_list("lp_id", "coefficient", "deadline", "version", "closed_at")
+        tombstones = set()
+        for lp_id, coefficient, deadline, version, closed_at in rows:
+            if closed_at is None:
+                self.put(lp_id, coefficient, deadline, version)
+            else:
+                tombstones.add(lp_id)
+                self.invalidate(lp_id, version)
+        # Надгробие, которое архиватор удалил из базы, больше не нужно и в памяти
+        for lp_id in self.tombstones - tombstones:
+            self.closed.pop(lp_id, None)
+        self.tombstones = tombstones
+        logger.info("Loaded %s actual events into cache", len(self.events))
+
+    def notify(self, previous: Optional[CachedEvent], current: Optional[CachedEvent]):
+        if self.on_change is None or previous == current:
+            return
+        if previous is None:
+            self.on_change("created", current.lp_id, current)
+        elif current is None:
+            self.on_change("closed", previous.lp_id, None)
+        elif previous.coefficient != current.coefficient:
+            self.on_change("coefficient_changed", current.lp_id, current)
+
+    def known_version(self, lp_id: int) -> int:
+        event = self.events.get(lp_id)
+        return max(event.version if event else -1, self.closed.get(lp_id, -1))
+
+    def put(self, lp_id: int, coefficient: Decimal, deadline: Optional[datetime], version: int = 0) -> bool:
+        if version <= self.known_version(lp_id):
+            return False
+        previous = self.events.get(lp_id)
+        self.closed.pop(lp_id, None)
+        self.events[lp_id] = CachedEvent(lp_id, coefficient, deadline, version)
+        self.notify(previous, self.events[lp_id])
+        return True
+
+    def invalidate(self, lp_id: int, version: Optional[int] = None) -> bool:
+        # Без версии событие закрывается безусловно (истёк дедлайн). Закрытие на той же версии применяется:
+        # истечение публикуется без смены версии события
+        event = self.events.get(lp_id)
+        if version is not None and (lp_id in self.closed or event is not None and version < event.version):
+            return False
+        self.closed[lp_id] = max(version or 0, self.known_version(lp_id), 0)
+        self.notify(self.events.pop(lp_id, None), None)
+        return True
+
+    def get(self, lp_id: int) -> Optional[CachedEvent]:
+        event = self.events.get(lp_id)
+        if event is None:
+            self.misses += 1
+            return None
+        if event.deadline is not None and event.deadline <= datetime.now(timezone.utc):
+            # Дедлайн line_provider прошёл раньше, чем пришла синхронизация
+            self.expired += 1
+            self.invalidate(lp_id)
+            return None
+        self.hits += 1
+        return event
+
+    def active(self) -> list[CachedEvent]:
+        now = datetime.now(timezone.utc)
+        return [event for event in self.events.values() if event.deadline is None or event.deadline > now]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.events),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
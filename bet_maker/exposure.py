@@ -0,0 +1,54 @@
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from tortoise.functions import Sum
+
+from models import ArchivedBet, Bet, BetStatus, EventExposure
+
+
+logger = logging.getLogger(__name__)
+
+
+UPSERT_EXPOSURE = {
+    # Одна вставка с приращением при конфликте: строка создаётся и увеличивается атомарно, без окна между
+    # UPDATE и INSERT, в котором две первые ставки на событие взаимно блокируются по gap-lock
+    "mysql": (
+        "INSERT INTO `event_exposure` (`lp_id`, `bet_count`, `total_stake`, `potential_payout`, `status`, "
+        "`total_payout`) VALUES (%s, %s, %s, %s, %s, 0) ON DUPLICATE KEY UPDATE "
+        "`bet_count` = `bet_count` + VALUES(`bet_count`), "
+        "`total_stake` = `total_stake` + VALUES(`total_stake`), "
+        "`potential_payout` = `potential_payout` + VALUES(`potential_payout`)"
+    ),
+    "sqlite": (
+        'INSERT INTO "event_exposure" ("lp_id", "bet_count", "total_stake", "potential_payout", "status", '
+        '"total_payout") VALUES (?, ?, ?, ?, ?, 0) ON CONFLICT ("lp_id") DO UPDATE SET '
+        '"bet_count" = "bet_count" + excluded."bet_count", '
+        '"total_stake" = "total_stake" + excluded."total_stake", '
+        '"potential_payout" = "potential_payout" + excluded."potential_payout"'
+    ),
+}
+
+
+async def add_exposure(lp_id: int, bet_count: int, stake: Decimal, potential_payout: Decimal):
+    client = EventExposure._meta.db
+    await client.execute_query(
+        UPSERT_EXPOSURE[client.capabilities.dialect],
+        [lp_id, bet_count, str(stake), str(potential_payout), BetStatus.pending.value]
+    )
+
+
+async def finalize_exposure(lp_id: int, new_status: BetStatus):
+    # Повторный расчёт может прийти после архивации, поэтому выплаты считаются по обеим таблицам
+    total_payout = 0
+    for model in (Bet, ArchivedBet):
+        totals = await model.filter(lp_id=lp_id, status=BetStatus.won).annotate(
+            total=Sum("payout")
+        ).first().values("total")
+        total_payout += (totals or {}).get("total") or 0
+    await EventExposure.filter(lp_id=lp_id).update(
+        status=new_status,
+        total_payout=total_payout,
+        settled_at=datetime.now(timezone.utc)
+    )
+    logger.info("Finalized exposure for event %s: total payout %s", lp_id, total_payout)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from typing import Optional
+
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+
+from exposure import add_exposure
+from models import Bet
+
+
+logger = logging.getLogger(__name__)
+
+
+def generated_key() -> str:
+    return uuid.uuid4().hex
+
+
+async def insert_bets(bets: list[Bet], check_existing: bool = True) -> list[Bet]:
+    # Ключ идемпотентности есть у каждой ставки: по нему находим уже сохранённые и получаем id после вставки
+    keys = [bet.idempotency_key for bet in bets]
+    for attempt in range(2):
+        saved = {}
+        if check_existing or attempt:
+            saved = {bet.idempotency_key: bet for bet in await Bet.filter(idempotency_key__in=keys)}
+        new_bets = {}
+        for bet in bets:
+            if bet.idempotency_key not in saved:
+                new_bets.setdefault(bet.idempotency_key, bet)
+        if not new_bets:
+            break
+        try:
+            async with in_transaction():
+                await Bet.bulk_create(list(new_bets.values()))
+                inserted = await Bet.filter(idempotency_key__in=list(new_bets))
+                totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+                for bet in inserted:
+                    total = totals[bet.lp_id]
+                    total[0] += 1
+                    total[1] += bet.amount
+                    total[2] += bet.amount * bet.coefficient
+                for lp_id, (bet_count, stake, potential_payout) in totals.items():
+                    await add_exposure(lp_id, bet_count, stake, potential_payout)
+            saved.update({bet.idempotency_key: bet for bet in inserted})
+            logger.info("Inserted %s bets, %s already existed", len(inserted), len(bets) - len(inserted))
+            break
+        except IntegrityError:
+            # Параллельный запрос успел вставить ставку с тем же ключом - перечитываем и повторяем
+            if attempt:
+                raise
+    return [saved[key] for key in keys]
+
+
+class BetBatcher:
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self.pending: list[tuple[Bet, bool, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: set[asyncio.Task] = set()
+
+    async def submit(self, bet: Bet, check_existing: bool) -> Bet:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((bet, check_existing, future))
+        if len(self.pending) >= self.max_size:
+            self.schedule_flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.schedule_flush)
+        return await future
+
+    def schedule_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self.flush(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def flush(self, batch: list[tuple[Bet, bool, asyncio.Future]]):
+        try:
+            saved = await insert_bets(
+                [bet for bet, _, _ in batch],
+                check_existing=any(check_existing for _, check_existing, _ in batch)
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), bet in zip(batch, saved):
+            if not future.done():
+                future.set_result(bet)
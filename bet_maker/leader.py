@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from tortoise import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    def __init__(
+            self,
+            name: str,
+            on_elected: Callable[[], Awaitable[None]],
+            on_demoted: Callable[[], Awaitable[None]],
+            retry_interval: float = 5
+    ):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        # Сначала останавливаем фоновые задачи, пока блокировка ещё наша, потом отпускаем её
+        await self.demote()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.hold_lock()
+            except Exception as e:
+                logger.error("Leader lock %s lost: %s", self.name, e)
+            await self.demote()
+            await asyncio.sleep(self.retry_interval)
+
+    async def hold_lock(self):
+        client = connections.get("default")
+        if client.capabilities.dialect != "mysql":
+            logger.warning("Leader election for %s needs MySQL, running background tasks unconditionally",
+                           self.name)
+            await self.elect()
+            await asyncio.Future()
+        # GET_LOCK живёт в сессии MySQL, поэтому соединение держится вне пула всё время лидерства
+        async with client.acquire_connection() as connection:
+            acquired = False
+            try:
+                while not acquired:
+                    acquired = await self.query(connection, "SELECT GET_LOCK(%s, 0)") == 1
+                    if not acquired:
+                        await asyncio.sleep(self.retry_interval)
+                await self.elect()
+                while await self.query(connection, "SELECT IS_USED_LOCK(%s) = CONNECTION_ID()") == 1:
+                    await asyncio.sleep(self.retry_interval)
+            finally:
+                if acquired:
+                    await self.demote()
+                    try:
+                        await self.query(connection, "SELECT RELEASE_LOCK(%s)")
+                    except Exception as e:
+                        logger.warning("Failed to release leader lock %s: %s", self.name, e)
+
+    async def query(self, connection, sql: str):
+        async with connection.cursor() as cursor:
+            await cursor.execute(sql, (self.name,))
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def elect(self):
+        if not self.is_leader:
+            self.is_leader = True
+            logger.info("Elected leader for %s", self.name)
+            await self.on_elected()
+
+    async def demote(self):
+        if self.is_leader:
+            self.is_leader = False
+            logger.info("Stepping down as leader for %s", self.name)
+            await self.on_demoted()
@@ -1,11 +1,48 @@
+import atexit
+import json
+import logging
 import os
+import queue
+import random
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
 logs_dir = "/storage/logs"
 os.makedirs(logs_dir, exist_ok=True)
 log_filename = os.path.join(logs_dir, "bet_maker.log")
 
-level = "INFO"
+level = os.getenv("LOG_LEVEL", "INFO")
+log_format = os.getenv("LOG_FORMAT", "text")
+access_sample_rate = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", "0.1"))
+
+log_queue = queue.SimpleQueue()
+listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.funcName}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class AccessLogSampler(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Ответы с ошибкой пишутся всегда, остальные - с вероятностью rate
+        status_code = record.args[4] if isinstance(record.args, tuple) and len(record.args) == 5 else 0
+        return status_code >= 400 or random.random() < self.rate
 
 
 logging_config = {
@@ -17,38 +54,41 @@ logging_config = {
                 '%(asctime)s - %(levelname)s - [%(name)s] - [%(filename)s : %(funcName)s : %(lineno)d] - %(message)s',
             "datefmt": "%Y-%m-%d %H:%M:%S"
         },
+        "json": {
+            "()": JsonFormatter,
+            "datefmt": "%Y-%m-%d %H:%M:%S"
+        },
     },
-    "handlers": {
-        "file": {
-            "level": level,
-            "class": "logging.FileHandler",
-            "filename": log_filename,
-            "formatter": "default"
+    "filters": {
+        "access_sampler": {
+            "()": AccessLogSampler,
+            "rate": access_sample_rate
         },
-        "console": {
-            "level": level,
-            "class": "logging.StreamHandler",
-            "formatter": "default"
+    },
+    "handlers": {
+        "queue": {
+            "()": QueueHandler,
+            "queue": log_queue
         },
     },
     "loggers": {
         "": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": level,
             "propagate": True
         },
         "fastapi": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": level,
             "propagate": False
         },
         "tortoise": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": False
         },
         "uvicorn": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": level,
             "propagate": False
         },
@@ -57,6 +97,22 @@ logging_config = {
 
 
 def setup_logging():
+    global listener
     with open(log_filename, 'w'):
         pass
     dictConfig(logging_config)
+    if listener:
+        return
+    # Запись в файл и консоль выполняется в отдельном потоке, обработчики запросов только кладут записи в очередь
+    formatter_config = logging_config["formatters"]["json" if log_format == "json" else "default"]
+    if log_format == "json":
+        formatter = JsonFormatter(datefmt=formatter_config["datefmt"])
+    else:
+        formatter = logging.Formatter(formatter_config["format"], datefmt=formatter_config["datefmt"])
+    handlers = [logging.FileHandler(log_filename), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
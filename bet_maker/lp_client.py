@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+import aiohttp
+
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+request_duration = metrics.histogram(
+    "lp_request_duration_seconds", "line_provider HTTP request latency including failed attempts", ("outcome",)
+)
+
+
+class LineProviderClient:
+    def __init__(self, base_url: str, timeout: float, retries: int, backoff: float, pool_size: int):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.requests_total = 0
+        self.errors_total = 0
+        self.latencies = deque(maxlen=1000)
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            base_url=self.base_url,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            raise_for_status=True
+        )
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+            logger.info("Closed line_provider client, stats: %s", self.stats())
+
+    async def get_json(self, path: str, params: Optional[dict] = None):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                async with self.session.get(path, params=params) as response:
+                    data = await response.json()
+                self._observe(time.perf_counter() - started)
+                return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._observe(time.perf_counter() - started, error=True)
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status >= 500
+                if not retryable or attempt >= self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                attempt += 1
+                logger.warning("Request to line_provider %s failed (%s: %s), retry %s in %.2fs",
+                               path, type(e).__name__, e, attempt, delay)
+                await asyncio.sleep(delay)
+
+    def _observe(self, latency: float, error: bool = False):
+        self.requests_total += 1
+        if error:
+            self.errors_total += 1
+        self.latencies.append(latency)
+        request_duration.observe(latency, outcome="error" if error else "ok")
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "error_rate": self.errors_total / self.requests_total if self.requests_total else 0.0,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_p99": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        }
@@ -1,26 +1,44 @@
 from fastapi.staticfiles import StaticFiles
-from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Query, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
-from tortoise import Tortoise
+from tortoise import Tortoise, connections
 from tortoise.transactions import atomic
 from tortoise_conf import TORTOISE_ORM
 import logging
-from fastapi_utils.tasks import repeat_every
 from typing import List
 from fastapi.responses import JSONResponse
-from logging_config import setup_logging, logging_config
+from logging_config import setup_logging, logging_config, level
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
-from models import ActualEvents, Bet
-import requests
+from models import ActualEvents, Bet, SyncState, EventExposure, ArchivedBet
 import aio_pika
 import asyncio
+import argparse
+import os
 from typing import Optional
 import json
 import config
-from schemas import EventOut, BetOut, BetCreate, BetStatus
+from lp_client import LineProviderClient
+from settlement import settle_event
+from catalogue import apply_changes, close_events
+from ingest import BetBatcher, insert_bets, generated_key
+from consumer import EventConsumer
+from dead_letters import DeadLetters
+from archive import BetArchiver
+from leader import LeaderElection
+from events_cache import ActualEventsCache, CachedEvent
+from stream import StreamHub
+from pagination import NEXT_CURSOR_HEADER, after_cursor, iter_chunks, iter_list_chunks, ndjson_response, rows_response
+from schemas import (EventOut, BetOut, BetCreate, BetStatus, LPEventChanges, LPCatalogueMessage, ExposureOut,
+                     DeadLetterOut, ReplayOut)
+from datetime import datetime, timezone
+import time
+import metrics
+from metrics import MetricsMiddleware, metrics_endpoint, instrument_tortoise, monitor_event_loop
+from health import (HealthChecks, AdmissionMiddleware, OK, DEGRADED, check_database, check_channel, live,
+                    ready_endpoint)
 
 
 setup_logging()
@@ -30,17 +48,18 @@ uvicorn_log_config = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": logging_config["formatters"],
+    "filters": logging_config["filters"],
     "handlers": logging_config["handlers"],
     "loggers": {
         "uvicorn.error": {
-            "level": "DEBUG",
-            "handlers": ["file", "console"],
+            "level": level,
+            "handlers": ["queue"],
             "propagate": False
         },
         "uvicorn.access": {
-            "formatter": "default",
-            "handlers": ["file", "console"],
-            "level": "DEBUG",
+            "filters": ["access_sampler"],
+            "handlers": ["queue"],
+            "level": level,
             "propagate": False
         },
     },
@@ -49,103 +68,412 @@ uvicorn_log_config = {
 
 connection: Optional[aio_pika.Connection] = None
 channel: Optional[aio_pika.Channel] = None
+lp_client = LineProviderClient(
+    base_url=config.lp_url,
+    timeout=config.lp_timeout,
+    retries=config.lp_retries,
+    backoff=config.lp_retry_backoff,
+    pool_size=config.lp_pool_size
+)
+consumer: Optional[EventConsumer] = None
+status_queue: Optional[aio_pika.Queue] = None
+dead_letters = DeadLetters(
+    "event_status_updates",
+    exchange=config.status_dead_letter_exchange,
+    max_attempts=config.status_retry_max_attempts,
+    base_delay=config.status_retry_base_delay,
+    max_delay=config.status_retry_max_delay
+)
+catalogue_consumer: Optional[EventConsumer] = None
+cache_consumer: Optional[EventConsumer] = None
+sync_task: Optional[asyncio.Task] = None
+archive_task: Optional[asyncio.Task] = None
+bet_archiver = BetArchiver(
+    age=config.archive_after,
+    interval=config.archive_interval,
+    batch_size=config.archive_batch_size,
+    pause=config.archive_batch_pause
+)
+cache_refresh_task: Optional[asyncio.Task] = None
+backlog_task: Optional[asyncio.Task] = None
+settlement_backlog = 0
+stream_exchange: Optional[aio_pika.Exchange] = None
+
+
+def cached_event_out(event: CachedEvent) -> dict:
+    return {"lp_id": event.lp_id, "coefficient": event.coefficient, "deadline": event.deadline}
+
+
+def stream_change(kind: str, lp_id: int, event: Optional[CachedEvent]):
+    stream_hub.publish(kind, cached_event_out(event) if event is not None else {"lp_id": lp_id})
+
+
+stream_hub = StreamHub(queue_size=config.stream_queue_size, keepalive=config.stream_keepalive)
+events_cache = ActualEventsCache(on_change=stream_change)
+bet_batcher = BetBatcher(window=config.bet_batch_window, max_size=config.bet_batch_max_size)
+loop_monitor: Optional[asyncio.Task] = None
+last_synced_at: Optional[float] = None
+
+
+def consumer_gauges(name: str) -> dict:
+    return {
+        (event_consumer.queue.name,): event_consumer.gauges()[name]
+        for event_consumer in (consumer, catalogue_consumer, cache_consumer) if event_consumer and event_consumer.queue
+    }
+
+
+def sync_lag() -> dict:
+    return {(): time.time() - last_synced_at} if last_synced_at else {}
+
+
+sync_duration = metrics.histogram("sync_duration_seconds", "Duration of a line_provider delta sync pass", ("outcome",))
+metrics.gauge("sync_lag_seconds", "Seconds since the last successful line_provider sync", callback=sync_lag)
+metrics.gauge("is_leader", "Whether this process runs the singleton background tasks",
+              callback=lambda: int(leader_election.is_leader))
+metrics.gauge("mq_queue_depth", "Messages waiting in the consumed queue", ("queue",),
+              callback=lambda: consumer_gauges("queue_depth"))
+metrics.gauge("mq_in_flight", "Messages being processed", ("queue",),
+              callback=lambda: consumer_gauges("in_flight"))
+metrics.gauge("mq_processing_lag_seconds", "Age of the last processed message", ("queue",),
+              callback=lambda: consumer_gauges("processing_lag"))
+metrics.counter("events_cache_lookups_total", "Actual events cache lookups on the bet path", ("result",),
+                callback=lambda: {
+                    ("hit",): events_cache.hits,
+                    ("miss",): events_cache.misses,
+                    ("expired",): events_cache.expired
+                })
+metrics.gauge("events_cache_size", "Events held in the actual events cache", callback=lambda: len(events_cache.events))
 
 
 async def process_message(message: aio_pika.IncomingMessage):
     async with message.process():
-        message_body = message.body
-        message_str = message_body.decode('utf-8')
-        message_data = json.loads(message_str)
-        logger.info(f"Received message: {message_data}")
-        event_id = message_data.get("event_id")
-        new_status = message_data.get("status")
-        if new_status != "незавершённое":
-            event = await ActualEvents.filter(lp_id=event_id).first()
-            if event:
-                await event.delete()
-                logger.info(f"Deleted event with lp_id: {event_id}")
-            if new_status == "завершено выигрышем первой команды":
-                new_status = BetStatus.won
-            elif new_status == "завершено выигрышем второй команды":
-                new_status = BetStatus.lost
-            else:
-                new_status = BetStatus.pending
-            bets = await Bet.filter(lp_id=event_id).all()
-            for bet in bets:
-                bet.status = new_status
-                await bet.save()
-                logger.info(f"Updated bet ID {bet.id} with status {new_status}")
+        try:
+            await settle_message(message)
+        except Exception as e:
+            await dead_letters.retry_or_park(message, e)
+
+
+async def settle_message(message: aio_pika.IncomingMessage):
+    message_body = message.body
+    message_str = message_body.decode('utf-8')
+    message_data = json.loads(message_str)
+    logger.info("Received message: %s", message_data)
+    event_id = message_data.get("event_id")
+    new_status = message_data.get("status")
+    version = message_data.get("version")
+    if not isinstance(event_id, int):
+        raise ValueError(f"Message has no valid event_id: {message_str}")
+    if new_status != "незавершённое":
+        events_cache.invalidate(event_id, version)
+        if new_status == "завершено выигрышем первой команды":
+            new_status = BetStatus.won
+        elif new_status == "завершено выигрышем второй команды":
+            new_status = BetStatus.lost
+        else:
+            new_status = BetStatus.pending
+        settled = await settle_event(event_id, new_status, version or 0, chunk_size=config.settle_chunk_size)
+        if new_status != BetStatus.pending:
+            await publish_settled(event_id, new_status, settled)
+
+
+async def publish_settled(lp_id: int, result: BetStatus, settled: int):
+    # Расчёт идёт только у лидера, подписчики других процессов узнают о нём через обменник потока
+    try:
+        await stream_exchange.publish(
+            aio_pika.Message(body=json.dumps({"lp_id": lp_id, "result": result.value, "settled": settled}).encode()),
+            routing_key="event.settled"
+        )
+    except Exception as e:
+        logger.warning("Failed to publish settlement of event %s to the stream: %s", lp_id, e)
+
+
+async def process_stream_message(message: aio_pika.IncomingMessage):
+    stream_hub.publish("settled", json.loads(message.body))
+
+
+def is_actual(event_data: LPCatalogueMessage) -> bool:
+    return event_data.status == "незавершённое" and event_data.deadline > datetime.now(timezone.utc)
+
+
+async def process_catalogue_message(message: aio_pika.IncomingMessage):
+    async with message.process():
+        event_data = LPCatalogueMessage.parse_raw(message.body)
+        logger.info("Received catalogue message %s: %s", message.routing_key, event_data)
+        await apply_changes([ActualEvents(
+            lp_id=event_data.event_id,
+            coefficient=event_data.coefficient,
+            deadline=event_data.deadline,
+            version=event_data.version,
+            closed_at=None if is_actual(event_data) else datetime.now(timezone.utc)
+        )])
+
+
+async def process_cache_message(message: aio_pika.IncomingMessage):
+    async with message.process():
+        event_data = LPCatalogueMessage.parse_raw(message.body)
+        if is_actual(event_data):
+            events_cache.put(event_data.event_id, event_data.coefficient, event_data.deadline, event_data.version)
+        else:
+            events_cache.invalidate(event_data.event_id, event_data.version)
+
+
+async def declare_catalogue_exchange() -> aio_pika.Exchange:
+    return await channel.declare_exchange(config.catalogue_exchange, aio_pika.ExchangeType.TOPIC, durable=True)
+
+
+async def start_background_tasks():
+    global consumer, catalogue_consumer, sync_task, archive_task
+    consumer = EventConsumer(
+        process_message,
+        concurrency=config.consumer_concurrency,
+        monitor_interval=config.consumer_monitor_interval
+    )
+    await consumer.start(status_queue)
+    catalogue_queue = await channel.declare_queue(config.catalogue_queue, durable=True)
+    await catalogue_queue.bind(await declare_catalogue_exchange(), routing_key="event.*")
+    catalogue_consumer = EventConsumer(
+        process_catalogue_message,
+        concurrency=config.consumer_concurrency,
+        monitor_interval=config.consumer_monitor_interval
+    )
+    await catalogue_consumer.start(catalogue_queue)
+    sync_task = asyncio.create_task(sync_loop())
+    archive_task = asyncio.create_task(bet_archiver.run())
+
+
+async def stop_background_tasks():
+    global consumer, catalogue_consumer, sync_task, archive_task
+    for task in (sync_task, archive_task):
+        if task:
+            task.cancel()
+    sync_task = archive_task = None
+    for event_consumer in (consumer, catalogue_consumer):
+        if event_consumer:
+            await event_consumer.stop(timeout=config.consumer_drain_timeout)
+    consumer = catalogue_consumer = None
+
+
+leader_election = LeaderElection(
+    "bet_maker_background",
+    on_elected=start_background_tasks,
+    on_demoted=stop_background_tasks,
+    retry_interval=config.leader_retry_interval
+)
+
+
+async def start_cache_updates():
+    # Каждый процесс, принимающий ставки, держит свой кэш и свою эксклюзивную очередь каталога
+    global cache_consumer, cache_refresh_task
+    await events_cache.load()
+    cache_queue = await channel.declare_queue(exclusive=True)
+    await cache_queue.bind(await declare_catalogue_exchange(), routing_key="event.*")
+    cache_consumer = EventConsumer(
+        process_cache_message,
+        concurrency=config.consumer_concurrency,
+        monitor_interval=config.consumer_monitor_interval
+    )
+    await cache_consumer.start(cache_queue)
+    stream_queue = await channel.declare_queue(exclusive=True)
+    await stream_queue.bind(stream_exchange, routing_key="event.*")
+    await stream_queue.consume(process_stream_message, no_ack=True)
+    cache_refresh_task = asyncio.create_task(cache_refresh_loop())
+
+
+async def cache_refresh_loop():
+    while True:
+        await asyncio.sleep(config.sync_interval)
+        try:
+            await events_cache.load()
+        except Exception as e:
+            logger.error("Failed to reload actual events cache: %s", e)
+
+
+async def monitor_backlog(queue: aio_pika.Queue):
+    # Глубину очереди расчётов видят все процессы, а не только лидер с консьюмером
+    global settlement_backlog
+    while True:
+        try:
+            declared = await queue.declare()
+            settlement_backlog = declared.message_count
+        except Exception as e:
+            logger.warning("Failed to read settlement backlog: %s", e)
+        await asyncio.sleep(config.consumer_monitor_interval)
 
 
 async def startup():
-    global connection, channel
+    global connection, channel, backlog_task, stream_exchange, status_queue
     connection = await aio_pika.connect_robust(f"amqp://{config.mq_user}:{config.mq_pwd}@{config.mq_host}/")
     channel = await connection.channel()
-    await channel.set_qos(prefetch_count=1)  # Ограничение количества сообщений, которые обрабатываются одновременно
-    queue = await channel.declare_queue("event_status_updates", durable=True)
-    await queue.consume(lambda message: asyncio.create_task(process_message(message)), no_ack=False)
+    await channel.set_qos(prefetch_count=config.mq_prefetch)
+    stream_exchange = await channel.declare_exchange(config.stream_exchange, aio_pika.ExchangeType.TOPIC)
+    status_queue = await dead_letters.declare(channel)
+    backlog_task = asyncio.create_task(monitor_backlog(status_queue))
+    if config.role != "worker":
+        await start_cache_updates()
+    if config.role != "api":
+        await leader_election.start()
 
 
 async def shutdown():
     global connection
+    await leader_election.stop()
+    for task in (cache_refresh_task, backlog_task):
+        if task:
+            task.cancel()
+    if cache_consumer:
+        await cache_consumer.stop(timeout=config.consumer_drain_timeout)
     if connection:
         await connection.close()
         print("Closed RabbitMQ connection")
 
 
-@repeat_every(seconds=5)
+async def apply_events_delta(state: SyncState, delta: LPEventChanges):
+    # Изменение применяется, только если его версия новее сохранённой: сообщения каталога идут параллельно
+    # с синхронизацией, и запоздавшее из них не должно откатить событие назад
+    closed_at = datetime.now(timezone.utc)
+    changes = [
+        ActualEvents(
+            lp_id=event_data.id,
+            coefficient=event_data.coefficient,
+            deadline=event_data.deadline,
+            version=event_data.version,
+            closed_at=None if event_data.status == "незавершённое" and event_data.deadline > delta.server_time
+            else closed_at
+        ) for event_data in delta.changed
+    ]
+    applied = await apply_changes(changes)
+    # Дедлайн события, вернувшегося в дельте актуальным, перенесли: из истёкших оно выбывает
+    actual_ids = {change.lp_id for change in changes if change.closed_at is None}
+    expired = await close_events({lp_id: 0 for lp_id in delta.expired if lp_id not in actual_ids})
+    # Курсор сохраняется после изменений: при сбое между ними дельта применится повторно и будет отброшена по версиям
+    state.cursor = delta.cursor
+    state.synced_at = delta.server_time
+    await state.save()
+    upserted = [event for event in applied if event.closed_at is None]
+    closed = [event for event in applied if event.closed_at is not None]
+    for event in closed:
+        events_cache.invalidate(event.lp_id, event.version)
+    for lp_id in expired:
+        events_cache.invalidate(lp_id)
+    for event in upserted:
+        events_cache.put(event.lp_id, event.coefficient, event.deadline, event.version)
+    if applied or expired:
+        logger.info("Applied events delta up to version %s: %s upserted, %s closed, %s expired",
+                    delta.cursor, len(upserted), len(closed), len(expired))
+
+
+async def sync_loop():
+    while True:
+        try:
+            await get_actual_events()
+        except Exception:
+            pass
+        await asyncio.sleep(config.sync_interval)
+
+
 async def get_actual_events():
+    global last_synced_at
+    started = time.perf_counter()
     try:
-        response = requests.get(f"http://{config.lp_host}:8001/actual_events/")
-        response.raise_for_status()
-        events = response.json()
-        current_events = await ActualEvents.all()
-        current_events_dict = {event.lp_id: event for event in current_events}
-        received_ids = {event['id'] for event in events}
-        ids_to_delete = [event.id for event in current_events if event.lp_id not in received_ids]
-        if ids_to_delete:
-            await ActualEvents.filter(id__in=ids_to_delete).delete()
-            logger.info(f"Deleted {len(ids_to_delete)} events from the database")
-        for event_data in events:
-            lp_id = event_data['id']
-            coefficient = event_data['coefficient']
-            if lp_id in current_events_dict:
-                pass
-            else:
-                new_event = ActualEvents(lp_id=lp_id, coefficient=coefficient)
-                await new_event.save()
-                logger.info(f"Added new event {lp_id} with coefficient: {coefficient}")
+        state, _ = await SyncState.get_or_create(id=1)
+        has_more = True
+        while has_more:
+            params = {"since": state.cursor, "limit": config.sync_batch_size}
+            if state.synced_at:
+                params["expired_since"] = state.synced_at.isoformat()
+            delta = LPEventChanges.parse_obj(await lp_client.get_json("/events/changes", params=params))
+            await apply_events_delta(state, delta)
+            has_more = delta.has_more
+        last_synced_at = time.time()
+        sync_duration.observe(time.perf_counter() - started, outcome="ok")
     except Exception as e:
-        logger.error(f"Failed to update actual events: {str(e)}")
+        sync_duration.observe(time.perf_counter() - started, outcome="failed")
+        logger.error("Failed to update actual events: %s", e)
         raise e
 
 
+async def warm_pool():
+    # Открываем соединения пула заранее, чтобы первые запросы после деплоя не ждали подключения
+    started = time.perf_counter()
+    client = connections.get("default")
+    await client.execute_query("SELECT 1")
+    await asyncio.gather(*(client.execute_query("SELECT 1") for _ in range(config.db_pool_warm - 1)))
+    logger.info("Warmed %s DB connections in %.3fs", config.db_pool_warm, time.perf_counter() - started)
+
+
+async def check_rabbitmq():
+    return check_channel(channel)
+
+
+async def check_sync():
+    state = await SyncState.get_or_none(id=1)
+    details = {"line_provider": lp_client.stats()}
+    if state is None or state.synced_at is None:
+        return DEGRADED, {"error": "events were never synced", **details}
+    age = (datetime.now(timezone.utc) - state.synced_at).total_seconds()
+    return OK if age <= config.sync_stale_after else DEGRADED, {"age": age, "cursor": state.cursor, **details}
+
+
+async def check_backlog():
+    overloaded = config.admission_backlog and settlement_backlog >= config.admission_backlog
+    return DEGRADED if overloaded else OK, {"depth": settlement_backlog}
+
+
+def overload(scope: dict) -> Optional[str]:
+    # Воркер не держит кэш событий и не принимает ставки: кроме /health, /metrics и /admin он отвечает 503
+    if config.role == "worker" and not scope["path"].startswith("/admin"):
+        return "worker_role"
+    if config.admission_db_waiters and metrics.db_in_flight - config.db_pool_max >= config.admission_db_waiters:
+        return "db_pool"
+    if config.admission_backlog and settlement_backlog >= config.admission_backlog:
+        return "consumer_backlog"
+    return None
+
+
+health = HealthChecks(timeout=config.health_check_timeout)
+health.add("database", check_database)
+health.add("rabbitmq", check_rabbitmq)
+health.add("sync", check_sync)
+health.add("backlog", check_backlog)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global loop_monitor
     await Tortoise.init(config=TORTOISE_ORM)
-    await Tortoise.generate_schemas()
-    await get_actual_events()
+    instrument_tortoise()
+    await warm_pool()
+    loop_monitor = asyncio.create_task(monitor_event_loop(config.loop_monitor_interval))
+    await lp_client.start()
     await startup()
-    logger.info(f'Database initiated')
+    logger.info("Started in %s role", config.role)
     yield
     await shutdown()
+    await lp_client.close()
+    loop_monitor.cancel()
     await Tortoise.close_connections()
 
 
 app = FastAPI(title="Bet Maker", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware, overload=overload, retry_after=config.admission_retry_after)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+app.add_route("/health/live", live, include_in_schema=False)
+app.add_route("/health/ready", ready_endpoint(health), include_in_schema=False)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    logger.error(f"HTTPException: {str(exc)}")
+    logger.error("HTTPException: %s", exc)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -154,7 +482,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"RequestValidationError: {str(exc)}")
+    logger.error("RequestValidationError: %s", exc)
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors()}
@@ -163,7 +491,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {str(exc)}")
+    logger.error("Unhandled exception: %s", exc)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Internal Server Error"}
@@ -171,47 +499,185 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 
 @app.get("/events/", response_model=list[EventOut])
-async def get_events():
+async def get_events(
+        after: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        stream: bool = False
+):
     logger.debug("Received request to get all events")
-    events = await ActualEvents.all()
-    logger.info(f"Retrieved {len(events)} events")
-    return [
-        EventOut(
-            lp_id=event.lp_id,
-            coefficient=event.coefficient
-        ) for event in events
-    ]
+    events = sorted(
+        (event for event in events_cache.active() if after is None or event.lp_id > after),
+        key=lambda event: event.lp_id
+    )
+    rows = [{"lp_id": event.lp_id, "coefficient": event.coefficient} for event in events]
+    if stream:
+        return ndjson_response(iter_list_chunks(rows))
+    rows = rows[:limit]
+    logger.info("Retrieved %s events", len(rows))
+    return rows_response(rows, limit, key="lp_id")
 
 
-@app.post("/bet", response_model=BetOut)
-async def create_bet(bet_data: BetCreate):
-    event = await ActualEvents.get_or_none(lp_id=bet_data.lp_id)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    bet = Bet(lp_id=bet_data.lp_id, amount=bet_data.amount)
-    await bet.save()
-    logger.info(f"Created bet with ID: {bet.id} for event ID: {bet.lp_id}")
+@app.get("/events/stream")
+async def stream_events():
+    logger.debug("Received request to stream actual events")
+    return stream_hub.response(lambda: {"events": [cached_event_out(event) for event in events_cache.active()]})
+
+
+@app.get("/admin/dead_letters", response_model=List[DeadLetterOut])
+async def get_dead_letters(limit: int = Query(100, ge=1, le=1000)):
+    logger.debug("Received request to inspect parked messages")
+    messages = await dead_letters.inspect(limit)
+    logger.info("Inspected %s parked messages", len(messages))
+    return [DeadLetterOut(**message) for message in messages]
+
+
+@app.post("/admin/dead_letters/replay", response_model=ReplayOut)
+async def replay_dead_letters(limit: int = Query(100, ge=1, le=1000)):
+    logger.debug("Received request to replay up to %s parked messages", limit)
+    return ReplayOut(replayed=await dead_letters.replay(limit))
+
+
+def bet_out(bet: Bet) -> BetOut:
     return BetOut(
         id=bet.id,
         lp_id=bet.lp_id,
         amount=float(bet.amount),
-        status=bet.status
+        coefficient=bet.coefficient,
+        status=bet.status,
+        payout=bet.payout
+    )
+
+
+@app.post("/bet", response_model=BetOut)
+async def create_bet(bet_data: BetCreate, idempotency_key: Optional[str] = Header(None, max_length=64)):
+    # Повтор запроса отвечает сохранённой ставкой до проверки события: к этому времени оно могло закрыться
+    if idempotency_key is not None:
+        bet = await Bet.get_or_none(idempotency_key=idempotency_key)
+        if bet:
+            return bet_out(bet)
+    event = events_cache.get(bet_data.lp_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    bet = Bet(
+        lp_id=bet_data.lp_id,
+        amount=bet_data.amount,
+        coefficient=event.coefficient,
+        idempotency_key=idempotency_key or generated_key()
+    )
+    # Существующая ставка уже проверена выше, параллельный дубль insert_bets поймает по уникальному ключу
+    if config.bet_batch_window > 0:
+        bet = await bet_batcher.submit(bet, check_existing=False)
+    else:
+        [bet] = await insert_bets([bet], check_existing=False)
+    logger.info("Created bet with ID: %s for event ID: %s", bet.id, bet.lp_id)
+    return bet_out(bet)
+
+
+@app.post("/bets/batch", response_model=List[BetOut])
+async def create_bets_batch(
+        bets_data: List[BetCreate] = Body(..., min_items=1, max_items=1000),
+        idempotency_key: Optional[str] = Header(None, max_length=64)
+):
+    logger.debug("Received request to create %s bets", len(bets_data))
+    if idempotency_key is not None:
+        keys = [f"{idempotency_key}:{index}" for index in range(len(bets_data))]
+        saved = {bet.idempotency_key: bet for bet in await Bet.filter(idempotency_key__in=keys)}
+        if len(saved) == len(keys):
+            return [bet_out(saved[key]) for key in keys]
+    events = {bet_data.lp_id: events_cache.get(bet_data.lp_id) for bet_data in bets_data}
+    missing = sorted(lp_id for lp_id, event in events.items() if event is None)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Events not found: {missing}")
+    bets = [
+        Bet(
+            lp_id=bet_data.lp_id,
+            amount=bet_data.amount,
+            coefficient=events[bet_data.lp_id].coefficient,
+            idempotency_key=f"{idempotency_key}:{index}" if idempotency_key else generated_key()
+        ) for index, bet_data in enumerate(bets_data)
+    ]
+    bets = await insert_bets(bets, check_existing=False)
+    logger.info("Created batch of %s bets", len(bets))
+    return [bet_out(bet) for bet in bets]
+
+
+@app.get("/events/{lp_id}/exposure", response_model=ExposureOut)
+async def get_event_exposure(lp_id: int):
+    logger.debug("Received request to get exposure of event ID: %s", lp_id)
+    exposure = await EventExposure.get_or_none(lp_id=lp_id)
+    if not exposure:
+        raise HTTPException(status_code=404, detail="Exposure not found")
+    return ExposureOut(
+        lp_id=exposure.lp_id,
+        bet_count=exposure.bet_count,
+        total_stake=float(exposure.total_stake),
+        potential_payout=float(exposure.potential_payout),
+        status=exposure.status,
+        total_payout=float(exposure.total_payout)
     )
 
 
+async def list_bets(model: type[Bet] | type[ArchivedBet], after: Optional[int], limit: int,
+                    bet_status: Optional[BetStatus], lp_id: Optional[int], stream: bool):
+    # Действующие и архивные ставки отдаются одинаково: фильтры, курсор по id и потоковая выдача
+    queryset = model.all()
+    if bet_status is not None:
+        queryset = queryset.filter(status=bet_status)
+    if lp_id is not None:
+        queryset = queryset.filter(lp_id=lp_id)
+    fields = ("id", "lp_id", "amount", "coefficient", "status", "payout")
+    if stream:
+        return ndjson_response(iter_chunks(queryset, fields, after=after))
+    bets = await after_cursor(queryset, after).limit(limit).values(*fields)
+    logger.info("Retrieved %s bets from %s", len(bets), model._meta.db_table)
+    return rows_response(bets, limit)
+
+
 @app.get("/bets", response_model=List[BetOut])
-async def get_bets():
+async def get_bets(
+        after: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        bet_status: Optional[BetStatus] = Query(None, alias="status"),
+        lp_id: Optional[int] = None,
+        stream: bool = False
+):
     logger.debug("Received request to get all bets")
-    bets = await Bet.all()
-    logger.info(f"Retrieved {len(bets)} bets")
-    return [
-        BetOut(
-            id=bet.id,
-            lp_id=bet.lp_id,
-            amount=float(bet.amount),
-            status=bet.status
-        ) for bet in bets
-    ]
+    return await list_bets(Bet, after, limit, bet_status, lp_id, stream)
+
+
+@app.get("/bets/history", response_model=List[BetOut])
+async def get_bets_history(
+        after: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        bet_status: Optional[BetStatus] = Query(None, alias="status"),
+        lp_id: Optional[int] = None,
+        stream: bool = False
+):
+    logger.debug("Received request to get archived bets")
+    return await list_bets(ArchivedBet, after, limit, bet_status, lp_id, stream)
+
+
+async def init_schemas():
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    await Tortoise.close_connections()
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host='0.0.0.0', port=8002, log_level="debug", log_config=uvicorn_log_config)
+    parser = argparse.ArgumentParser(description="Bet Maker")
+    parser.add_argument("--role", choices=("all", "api", "worker"), default=config.role,
+                        help="api serves HTTP only, worker runs consumers and sync under leader election, all does both")
+    parser.add_argument("--workers", type=int, default=config.workers, help="Number of HTTP worker processes")
+    args = parser.parse_args()
+    # Воркеры uvicorn импортируют main заново, роль передаётся им через окружение
+    os.environ["ROLE"] = config.role = args.role
+    if config.generate_schemas:
+        asyncio.run(init_schemas())
+    uvicorn.run(
+        app if args.workers == 1 or args.role == "worker" else "main:app",
+        host='0.0.0.0',
+        port=config.port,
+        workers=args.workers if args.role != "worker" else 1,
+        log_level=level.lower(),
+        log_config=uvicorn_log_config
+    )
@@ -0,0 +1,278 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import math
+import time
+from typing import Callable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+in_db_query = contextvars.ContextVar("in_db_query", default=False)
+# Запросы, которые выполняются или ждут соединения из пула
+db_in_flight = 0
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), callback: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # callback возвращает число или словарь {значения меток: число} и читается в момент выдачи
+        self.callback = callback
+        self.values: dict[tuple, float] = {}
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def samples(self) -> list[tuple[str, tuple, str, float]]:
+        values = self.values
+        if self.callback is not None:
+            result = self.callback()
+            values = result if isinstance(result, dict) else {(): result}
+        return [("", labels, "", value) for labels, value in values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labelnames, labels, extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts: dict[tuple, list[int]] = {}
+        self.sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * len(self.buckets)
+            self.sums[key] = 0.0
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self.sums[key] += value
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def samples(self) -> list[tuple[str, tuple, str, float]]:
+        samples = []
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(("_bucket", key, f'le="{format_value(bound)}"', cumulative))
+            samples.append(("_sum", key, "", self.sums[key]))
+            samples.append(("_count", key, "", cumulative))
+        return samples
+
+
+class Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Воркер uvicorn исполняет main.py дважды (как __mp_main__ и как main), действует последняя регистрация
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning("Failed to collect metric %s: %s", metric.name, e)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple = (), callback: Optional[Callable] = None) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames, callback))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple = (), callback: Optional[Callable] = None) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames, callback))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+http_request_duration = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+db_query_duration = histogram("db_query_duration_seconds", "Tortoise query latency by operation", ("operation",))
+gauge("db_queries_in_flight", "Tortoise queries running or waiting for a pool connection",
+      callback=lambda: db_in_flight)
+db_query_errors = counter("db_query_errors_total", "Failed Tortoise queries by operation", ("operation",))
+mq_published = counter("mq_published_total", "RabbitMQ messages published", ("exchange", "routing_key", "outcome"))
+mq_publish_duration = histogram("mq_publish_duration_seconds", "RabbitMQ publish latency including broker confirm")
+mq_consumed = counter("mq_consumed_total", "RabbitMQ messages consumed", ("queue", "outcome"))
+mq_consume_duration = histogram("mq_consume_duration_seconds", "RabbitMQ message handling latency", ("queue",))
+event_loop_lag = gauge("event_loop_lag_seconds", "Delay of the event loop waking up a scheduled callback")
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.routes: dict = {}
+
+    def route_path(self, scope) -> str:
+        # После маршрутизации в scope лежит endpoint, по нему берём шаблон пути, чтобы не плодить метки по id
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self.routes.get(endpoint)
+        if path is None:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                    path = route.path
+                    break
+            else:
+                path = "unmatched"
+            self.routes[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=self.route_path(scope),
+                status=status_code
+            )
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+def timed_query(method, operation: str):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        global db_in_flight
+        # Вложенные вызовы (execute_query_dict -> execute_query) учитываются один раз
+        if in_db_query.get():
+            return await method(*args, **kwargs)
+        token = in_db_query.set(True)
+        db_in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            db_query_errors.inc(operation=operation)
+            raise
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, operation=operation)
+            db_in_flight -= 1
+            in_db_query.reset(token)
+    wrapper.timed_query = True
+    return wrapper
+
+
+def instrument_tortoise():
+    from tortoise import connections
+
+    operations = {
+        "execute_query": "query",
+        "execute_query_dict": "query",
+        "execute_insert": "insert",
+        "execute_many": "many",
+        "execute_script": "script",
+    }
+    for client in connections.all():
+        for name, operation in operations.items():
+            for cls in type(client).__mro__:
+                method = cls.__dict__.get(name)
+                if method is not None:
+                    if not getattr(method, "timed_query", False):
+                        setattr(cls, name, timed_query(method, operation))
+                    break
+
+
+async def monitor_event_loop(interval: float = 1):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        event_loop_lag.set(max(time.perf_counter() - started - interval, 0.0))
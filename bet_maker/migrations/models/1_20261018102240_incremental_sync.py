@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `actual_events` ADD `deadline` DATETIME(6);
+        CREATE TABLE IF NOT EXISTS `sync_state` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `cursor` BIGINT NOT NULL  DEFAULT 0,
+    `synced_at` DATETIME(6)
+) CHARACTER SET utf8mb4;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `actual_events` DROP COLUMN `deadline`;
+        DROP TABLE IF EXISTS `sync_state`;"""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DELETE `a` FROM `actual_events` `a` JOIN `actual_events` `b` ON `a`.`lp_id` = `b`.`lp_id` AND `a`.`id` > `b`.`id`;
+        ALTER TABLE `actual_events` ADD UNIQUE INDEX `uid_actual_even_lp_id_38e9dc` (`lp_id`);
+        ALTER TABLE `bets` ADD INDEX `idx_bets_lp_id_a3106c` (`lp_id`, `status`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `actual_events` DROP INDEX `uid_actual_even_lp_id_38e9dc`;
+        ALTER TABLE `bets` DROP INDEX `idx_bets_lp_id_a3106c`;"""
@@ -0,0 +1,25 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `bets` ADD `payout` DECIMAL(16,2);
+        CREATE TABLE IF NOT EXISTS `event_exposure` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `lp_id` INT NOT NULL UNIQUE,
+    `bet_count` INT NOT NULL  DEFAULT 0,
+    `total_stake` DECIMAL(16,2) NOT NULL  DEFAULT 0,
+    `potential_payout` DECIMAL(16,2) NOT NULL  DEFAULT 0,
+    `status` VARCHAR(20) NOT NULL  COMMENT 'pending: еще не сыграла\nwon: выиграла\nlost: проиграла' DEFAULT 'еще не сыграла',
+    `total_payout` DECIMAL(16,2) NOT NULL  DEFAULT 0,
+    `settled_at` DATETIME(6)
+) CHARACTER SET utf8mb4;
+        INSERT INTO `event_exposure` (`lp_id`, `bet_count`, `total_stake`, `potential_payout`)
+    SELECT `lp_id`, COUNT(*), SUM(`amount`), SUM(`amount` * COALESCE(`coefficient`, 0)) FROM `bets`
+    WHERE `status` = 'еще не сыграла' GROUP BY `lp_id`;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `bets` DROP COLUMN `payout`;
+        DROP TABLE IF EXISTS `event_exposure`;"""
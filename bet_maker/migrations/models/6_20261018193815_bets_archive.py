@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `event_exposure` ADD `archived_at` DATETIME(6);
+        CREATE TABLE IF NOT EXISTS `bets_archive` (
+    `id` INT NOT NULL PRIMARY KEY,
+    `lp_id` INT NOT NULL,
+    `amount` DECIMAL(10,2) NOT NULL,
+    `coefficient` DECIMAL(5,2),
+    `status` VARCHAR(20) NOT NULL  COMMENT 'pending: еще не сыграла\nwon: выиграла\nlost: проиграла',
+    `payout` DECIMAL(16,2),
+    `idempotency_key` VARCHAR(80),
+    `archived_at` DATETIME(6) NOT NULL,
+    KEY `idx_bets_archiv_lp_id_c4af6b` (`lp_id`)
+) CHARACTER SET utf8mb4;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `event_exposure` DROP COLUMN `archived_at`;
+        DROP TABLE IF EXISTS `bets_archive`;"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `actual_events` ADD `version` BIGINT NOT NULL  DEFAULT 0;
+        ALTER TABLE `actual_events` ADD `closed_at` DATETIME(6);
+        ALTER TABLE `actual_events` ADD INDEX `idx_actual_even_closed__73607d` (`closed_at`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `actual_events` DROP INDEX `idx_actual_even_closed__73607d`;
+        ALTER TABLE `actual_events` DROP COLUMN `closed_at`;
+        ALTER TABLE `actual_events` DROP COLUMN `version`;"""
@@ -16,18 +16,65 @@ class BetStatus(str, Enum):
 
 class ActualEvents(models.Model):
     id = fields.IntField(pk=True)
-    lp_id = fields.IntField()
+    lp_id = fields.IntField(unique=True)
     coefficient = fields.DecimalField(max_digits=5, decimal_places=2)
+    deadline = fields.DatetimeField(null=True)
+    version = fields.BigIntField(default=0)
+    # Закрытое событие остаётся надгробием, чтобы запоздавшее сообщение с меньшей версией его не вернуло
+    closed_at = fields.DatetimeField(null=True, index=True)
 
     class Meta:
         table = "actual_events"
 
 
+class SyncState(models.Model):
+    id = fields.IntField(pk=True)
+    cursor = fields.BigIntField(default=0)
+    synced_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "sync_state"
+
+
 class Bet(models.Model):
     id = fields.IntField(pk=True)
     lp_id = fields.IntField()
     amount = fields.DecimalField(max_digits=10, decimal_places=2)
+    coefficient = fields.DecimalField(max_digits=5, decimal_places=2, null=True)
     status = fields.CharEnumField(BetStatus, max_length=20, default=BetStatus.pending)
+    payout = fields.DecimalField(max_digits=16, decimal_places=2, null=True)
+    idempotency_key = fields.CharField(max_length=80, null=True, unique=True)
 
     class Meta:
         table = "bets"
+        indexes = (("lp_id", "status"),)
+
+
+class EventExposure(models.Model):
+    id = fields.IntField(pk=True)
+    lp_id = fields.IntField(unique=True)
+    bet_count = fields.IntField(default=0)
+    total_stake = fields.DecimalField(max_digits=16, decimal_places=2, default=0)
+    potential_payout = fields.DecimalField(max_digits=16, decimal_places=2, default=0)
+    status = fields.CharEnumField(BetStatus, max_length=20, default=BetStatus.pending)
+    total_payout = fields.DecimalField(max_digits=16, decimal_places=2, default=0)
+    settled_at = fields.DatetimeField(null=True)
+    archived_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "event_exposure"
+
+
+class ArchivedBet(models.Model):
+    # Рассчитанные ставки переносятся сюда из bets с прежним id
+    id = fields.IntField(pk=True, generated=False)
+    lp_id = fields.IntField(index=True)
+    amount = fields.DecimalField(max_digits=10, decimal_places=2)
+    coefficient = fields.DecimalField(max_digits=5, decimal_places=2, null=True)
+    status = fields.CharEnumField(BetStatus, max_length=20)
+    payout = fields.DecimalField(max_digits=16, decimal_places=2, null=True)
+    idempotency_key = fields.CharField(max_length=80, null=True)
+    archived_at = fields.DatetimeField()
+
+    class Meta:
+        table = "bets_archive"
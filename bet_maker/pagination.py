@@ -0,0 +1,78 @@
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import AsyncIterator, Iterable, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from tortoise.queryset import QuerySet
+
+
+STREAM_CHUNK_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def after_cursor(queryset: QuerySet, after: Optional[int], key: str = "id") -> QuerySet:
+    if after is not None:
+        queryset = queryset.filter(**{f"{key}__gt": after})
+    return queryset.order_by(key)
+
+
+def set_next_cursor(response: Response, items: list, limit: int, key: str = "id"):
+    if items and len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = str(last[key] if isinstance(last, dict) else getattr(last, key))
+
+
+async def iter_chunks(
+        queryset: QuerySet,
+        fields: Iterable[str],
+        after: Optional[int] = None,
+        key: str = "id",
+        chunk_size: int = STREAM_CHUNK_SIZE
+) -> AsyncIterator[list[dict]]:
+    while True:
+        rows = await after_cursor(queryset, after, key).limit(chunk_size).values(*fields)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][key]
+
+
+async def iter_list_chunks(items: list[dict], chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[list[dict]]:
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(Response):
+    # Строки из .values() сериализуются напрямую, без моделей Pydantic и повторной валидации response_model
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
+def rows_response(rows: list[dict], limit: Optional[int] = None, key: str = "id") -> FastJSONResponse:
+    response = FastJSONResponse(rows)
+    if limit is not None:
+        set_next_cursor(response, rows, limit, key)
+    return response
+
+
+def ndjson_response(chunks: AsyncIterator[list[dict]]) -> StreamingResponse:
+    async def body():
+        async for rows in chunks:
+            yield b"".join(orjson.dumps(row, default=json_default) + b"\n" for row in rows)
+    return StreamingResponse(body(), media_type="application/x-ndjson")
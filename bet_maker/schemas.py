@@ -1,5 +1,8 @@
 from pydantic import BaseModel, condecimal, validator
+from typing import Optional
 from models import BetStatus
+from datetime import datetime, timezone
+from decimal import Decimal
 
 
 class EventOut(BaseModel):
@@ -22,4 +25,58 @@ class BetOut(BaseModel):
     id: int
     lp_id: int
     amount: float
+    coefficient: Optional[float]
     status: BetStatus
+    payout: Optional[float]
+
+
+def ensure_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class LPEventChange(BaseModel):
+    id: int
+    coefficient: Decimal
+    deadline: datetime
+    status: str
+    version: int
+
+    _deadline_utc = validator('deadline', allow_reuse=True)(ensure_utc)
+
+
+class LPEventChanges(BaseModel):
+    cursor: int
+    server_time: datetime
+    has_more: bool
+    changed: list[LPEventChange]
+    expired: list[int]
+
+
+class LPCatalogueMessage(BaseModel):
+    event_id: int
+    coefficient: Decimal
+    deadline: datetime
+    status: str
+    version: int
+
+    _deadline_utc = validator('deadline', allow_reuse=True)(ensure_utc)
+
+
+class ExposureOut(BaseModel):
+    lp_id: int
+    bet_count: int
+    total_stake: float
+    potential_payout: float
+    status: BetStatus
+    total_payout: float
+
+
+class DeadLetterOut(BaseModel):
+    body: str
+    reason: Optional[str]
+    attempts: int
+    failed_at: Optional[datetime]
+
+
+class ReplayOut(BaseModel):
+    replayed: int
@@ -0,0 +1,44 @@
+import logging
+import time
+
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from catalogue import close_events
+from exposure import finalize_exposure
+from models import Bet, BetStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+def settled_values(new_status: BetStatus) -> dict:
+    if new_status == BetStatus.won:
+        return {"status": new_status, "payout": F("amount") * F("coefficient")}
+    return {"status": new_status, "payout": 0}
+
+
+async def settle_event(lp_id: int, new_status: BetStatus, version: int = 0, chunk_size: int = 0) -> int:
+    # Обновляются только ставки в статусе pending, поэтому повторная доставка сообщения ничего не меняет
+    started = time.perf_counter()
+    settled = 0
+    # Событие закрывается до расчёта и отдельно от него: запись в actual_events сериализуется блокировкой каталога
+    await close_events({lp_id: version})
+    if chunk_size <= 0:
+        async with in_transaction():
+            if new_status != BetStatus.pending:
+                settled = await Bet.filter(lp_id=lp_id, status=BetStatus.pending).update(**settled_values(new_status))
+                await finalize_exposure(lp_id, new_status)
+    else:
+        while new_status != BetStatus.pending:
+            async with in_transaction():
+                ids = await Bet.filter(
+                    lp_id=lp_id, status=BetStatus.pending
+                ).order_by("id").limit(chunk_size).values_list("id", flat=True)
+                if not ids:
+                    await finalize_exposure(lp_id, new_status)
+                    break
+                settled += await Bet.filter(id__in=ids, status=BetStatus.pending).update(**settled_values(new_status))
+    logger.info("Settled %s bets for event %s with status %s in %.3fs",
+                settled, lp_id, new_status.value, time.perf_counter() - started)
+    return settled
@@ -12,7 +12,41 @@ db_user = os.getenv("DB_USER", "root")
 db_pass = os.getenv("DB_PASS", "12451245")
 db_name = os.getenv("DB_NAME", "line_provider")
 db_port = os.getenv("DB_PORT", "3306")
+db_charset = os.getenv("DB_CHARSET", "utf8mb4")
+db_pool_min = int(os.getenv("DB_POOL_MIN", "5"))
+db_pool_max = int(os.getenv("DB_POOL_MAX", "20"))
+db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+db_pool_warm = int(os.getenv("DB_POOL_WARM", str(db_pool_min)))
+db_connect_timeout = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+db_statement_timeout = float(os.getenv("DB_STATEMENT_TIMEOUT", "30"))
+
+app_env = os.getenv("APP_ENV", "development")
 
 mq_user = os.getenv("MQ_USER", "guest")
 mq_pwd = os.getenv("MQ_PWD", "guest")
 mq_host = os.getenv("MQ_HOST", "127.0.0.1")
+
+outbox_batch_size = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+outbox_poll_interval = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+
+catalogue_exchange = os.getenv("CATALOGUE_EXCHANGE", "event_catalogue")
+active_events_refresh_interval = float(os.getenv("ACTIVE_EVENTS_REFRESH_INTERVAL", "60"))
+
+loop_monitor_interval = float(os.getenv("LOOP_MONITOR_INTERVAL", "1"))
+
+role = os.getenv("ROLE", "all")
+workers = int(os.getenv("WORKERS", "1"))
+port = int(os.getenv("PORT", "8001"))
+leader_retry_interval = float(os.getenv("LEADER_RETRY_INTERVAL", "5"))
+generate_schemas = os.getenv("GENERATE_SCHEMAS", "false" if app_env == "production" else "true").lower() == "true"
+
+health_check_timeout = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+outbox_monitor_interval = float(os.getenv("OUTBOX_MONITOR_INTERVAL", "5"))
+admission_db_waiters = int(os.getenv("ADMISSION_DB_WAITERS", str(db_pool_max)))
+admission_outbox_backlog = int(os.getenv("ADMISSION_OUTBOX_BACKLOG", "10000"))
+admission_retry_after = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+stream_queue_size = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))
+stream_keepalive = float(os.getenv("STREAM_KEEPALIVE", "15"))
+
+status_dead_letter_exchange = os.getenv("STATUS_DEAD_LETTER_EXCHANGE", "event_status_updates.dlx")
@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from models import Event, EventStatus, VersionCounter, epoch_ms
+
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveEvent(NamedTuple):
+    id: int
+    coefficient: Decimal
+    deadline: float
+    version: int
+
+
+class DeadlineScheduler:
+    def __init__(
+            self,
+            on_expired: Callable[[list[int]], Awaitable[None]],
+            on_change: Optional[Callable[[str, int, Optional[ActiveEvent]], None]] = None
+    ):
+        self.on_expired = on_expired
+        # Вызывается при появлении события (created), смене коэффициента (coefficient_changed) и закрытии (closed)
+        self.on_change = on_change
+        self.active: dict[int, ActiveEvent] = {}
+        # Версии закрытых событий, чтобы запоздавшее сообщение каталога не вернуло событие в активные
+        self.closed: dict[int, int] = {}
+        # Последняя выданная версия на момент предыдущей загрузки
+        self.loaded_version = 0
+        # (дедлайн, id); записи удалённых и изменённых событий вычищаются лениво при извлечении
+        self.heap: list[tuple[float, int]] = []
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        # Снимок сливается по версиям, а не заменяет состояние: изменения, применённые пока шёл запрос,
+        # не затираются, а закрытое событие не возвращается строкой со старой версией
+        watermark = await VersionCounter.filter(id=1).first().values_list("value", flat=True) or 0
+        rows = await Event.filter(status=EventStatus.unfinished, deadline__gt=datetime.utcnow()).values_list(
+            "id", "coefficient", "deadline", "version"
+        )
+        loaded = set()
+        for event_id, coefficient, deadline, version in rows:
+            loaded.add(event_id)
+            self.update(event_id, coefficient, deadline, EventStatus.unfinished, version)
+        # Активные здесь, но не попавшие в снимок: их закрыл или перенёс другой воркер, перечитываем по id
+        missing = [event_id for event_id in self.active if event_id not in loaded]
+        if missing:
+            found = set()
+            for event_id, coefficient, deadline, event_status, version in await Event.filter(
+                    id__in=missing
+            ).values_list("id", "coefficient", "deadline", "status", "version"):
+                found.add(event_id)
+                self.update(event_id, coefficient, deadline, event_status, version)
+            for event_id in set(missing) - found:
+                self.discard(event_id)
+        # Закрытия до предыдущей загрузки старше интервала обновления, запоздавших сообщений о них уже не ждём
+        self.closed = {
+            event_id: version for event_id, version in self.closed.items() if version > self.loaded_version
+        }
+        self.loaded_version = watermark
+        self.wakeup.set()
+        logger.info("Loaded %s active events", len(self.active))
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def notify(self, previous: Optional[ActiveEvent], current: Optional[ActiveEvent]):
+        if self.on_change is None or previous == current:
+            return
+        if previous is None:
+            self.on_change("created", current.id, current)
+        elif current is None:
+            self.on_change("closed", previous.id, None)
+        elif previous.coefficient != current.coefficient:
+            self.on_change("coefficient_changed", current.id, current)
+
+    def update(self, event_id: int, coefficient: Decimal, deadline: datetime, status: EventStatus, version: int):
+        current = self.active.get(event_id)
+        known_version = current.version if current is not None else self.closed.get(event_id)
+        if known_version is not None and known_version > version:
+            return
+        deadline_ts = epoch_ms(deadline) / 1000
+        if status != EventStatus.unfinished or deadline_ts <= time.time():
+            self.remove(event_id, version)
+            return
+        self.closed.pop(event_id, None)
+        self.active[event_id] = ActiveEvent(event_id, coefficient, deadline_ts, version)
+        self.notify(current, self.active[event_id])
+        if current is None or current.deadline != deadline_ts:
+            heapq.heappush(self.heap, (deadline_ts, event_id))
+            if self.heap[0] == (deadline_ts, event_id):
+                self.wakeup.set()
+
+    def update_event(self, event: Event):
+        self.update(event.id, event.coefficient, event.deadline, event.status, event.version)
+
+    def remove(self, event_id: int, version: int):
+        event = self.active.pop(event_id, None)
+        self.closed[event_id] = max(version, self.closed.get(event_id, version))
+        self.notify(event, None)
+
+    def discard(self, event_id: int):
+        event = self.active.get(event_id)
+        if event is not None:
+            self.remove(event_id, event.version)
+
+    def events(self) -> list[ActiveEvent]:
+        now = time.time()
+        return sorted((event for event in self.active.values() if event.deadline > now), key=lambda event: event.id)
+
+    def pop_expired(self) -> list[int]:
+        now = time.time()
+        expired = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, event_id = heapq.heappop(self.heap)
+            event = self.active.get(event_id)
+            if event is not None and event.deadline == deadline:
+                self.remove(event_id, event.version)
+                expired.append(event_id)
+        return expired
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            expired = self.pop_expired()
+            if expired:
+                try:
+                    await self.on_expired(expired)
+                except Exception as e:
+                    logger.error("Failed to handle expiry of %s events: %s", len(expired), e)
+            timeout = max(self.heap[0][0] - time.time(), 0) if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
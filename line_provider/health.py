@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from tortoise import connections
+
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+DEGRADED = "degraded"
+DOWN = "down"
+
+requests_shed = metrics.counter("http_requests_shed_total", "Requests rejected by admission control", ("reason",))
+
+
+class HealthChecks:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.checks: dict[str, Callable[[], Awaitable[tuple[str, dict]]]] = {}
+
+    def add(self, name: str, check: Callable[[], Awaitable[tuple[str, dict]]]):
+        self.checks[name] = check
+
+    async def run(self, name: str, check: Callable[[], Awaitable[tuple[str, dict]]]) -> dict:
+        try:
+            state, details = await asyncio.wait_for(check(), timeout=self.timeout)
+        except Exception as e:
+            logger.warning("Health check %s failed: %s", name, e)
+            state, details = DOWN, {"error": str(e) or type(e).__name__}
+        return {"status": state, **details}
+
+    async def report(self) -> tuple[bool, dict]:
+        results = await asyncio.gather(*(self.run(name, check) for name, check in self.checks.items()))
+        checks = dict(zip(self.checks, results))
+        states = {result["status"] for result in results}
+        # degraded не снимает сервис с балансировки, down - снимает
+        state = DOWN if DOWN in states else DEGRADED if DEGRADED in states else OK
+        return state != DOWN, {"status": state, "checks": checks}
+
+
+def pool_stats() -> dict:
+    pool = getattr(connections.get("default"), "_pool", None)
+    stats = {"in_flight": metrics.db_in_flight}
+    if pool is not None:
+        stats.update(size=pool.size, free=pool.freesize, max=pool.maxsize)
+    return stats
+
+
+async def check_database() -> tuple[str, dict]:
+    await connections.get("default").execute_query("SELECT 1")
+    return OK, pool_stats()
+
+
+def check_channel(channel) -> tuple[str, dict]:
+    if channel is None or channel.is_closed:
+        return DOWN, {"error": "channel is closed"}
+    return OK, {}
+
+
+async def live(request: Request) -> JSONResponse:
+    return JSONResponse({"status": OK, "event_loop_lag": metrics.event_loop_lag.values.get((), 0.0)})
+
+
+def ready_endpoint(health: HealthChecks):
+    async def ready(request: Request) -> JSONResponse:
+        is_ready, body = await health.report()
+        return JSONResponse(body, status_code=200 if is_ready else 503)
+    return ready
+
+
+class AdmissionMiddleware:
+    def __init__(
+            self,
+            app,
+            overload: Callable[[dict], Optional[str]],
+            retry_after: float,
+            exempt: tuple = ("/health", "/metrics", "/static")
+    ):
+        self.app = app
+        self.overload = overload
+        self.retry_after = str(max(math.ceil(retry_after), 1))
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(self.exempt):
+            reason = self.overload(scope)
+            if reason:
+                # Быстрый отказ вместо очереди: клиент повторит запрос после Retry-After
+                requests_shed.inc(reason=reason)
+                response = JSONResponse(
+                    {"detail": f"Service unavailable: {reason}"},
+                    status_code=503,
+                    headers={"Retry-After": self.retry_after}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
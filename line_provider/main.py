@@ -1,22 +1,42 @@
 from fastapi.staticfiles import StaticFiles
-from fastapi import FastAPI, status, Request
+from fastapi import FastAPI, HTTPException, status, Request, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
-from tortoise import Tortoise
+from tortoise import Tortoise, connections
+from tortoise.transactions import in_transaction
+from tortoise.expressions import RawSQL
+from tortoise.functions import Count, Max, Min
 from tortoise_conf import TORTOISE_ORM
 import logging
 from fastapi.responses import JSONResponse
-from logging_config import setup_logging, logging_config
+from logging_config import setup_logging, logging_config, level
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
 import config
-import json
 from typing import Optional
 import aio_pika
-from datetime import datetime
-from models import Event, EventStatus
-from schemas import EventIn, EventOut, StatusUpdate, EventBasicOut
+import json
+from decimal import Decimal
+from datetime import datetime, timezone
+from models import (Event, EventStatus, OutboxMessage, OddsHistory, next_version, ensure_version_counter,
+                    epoch_ms, odds_record)
+from schemas import (EventIn, EventOut, StatusUpdate, EventBasicOut, EventChangesOut, EventStatusUpdate,
+                     CoefficientUpdate, OddsPoint)
+from outbox import OutboxRelay
+from expiry import ActiveEvent, DeadlineScheduler
+from leader import LeaderElection
+from stream import StreamHub
+from pagination import (NEXT_CURSOR_HEADER, after_cursor, iter_chunks, ndjson_response, rows_response,
+                        FastJSONResponse)
+import asyncio
+import argparse
+import time
+import os
+import metrics
+from metrics import MetricsMiddleware, metrics_endpoint, instrument_tortoise, monitor_event_loop
+from health import (HealthChecks, AdmissionMiddleware, OK, DEGRADED, check_database, check_channel, live,
+                    ready_endpoint)
 
 
 setup_logging()
@@ -26,17 +46,18 @@ uvicorn_log_config = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": logging_config["formatters"],
+    "filters": logging_config["filters"],
     "handlers": logging_config["handlers"],
     "loggers": {
         "uvicorn.error": {
-            "level": "DEBUG",
-            "handlers": ["file", "console"],
+            "level": level,
+            "handlers": ["queue"],
             "propagate": False
         },
         "uvicorn.access": {
-            "formatter": "default",
-            "handlers": ["file", "console"],
-            "level": "DEBUG",
+            "filters": ["access_sampler"],
+            "handlers": ["queue"],
+            "level": level,
             "propagate": False
         },
     },
@@ -44,47 +65,207 @@ uvicorn_log_config = {
 
 connection: Optional[aio_pika.Connection] = None
 channel: Optional[aio_pika.Channel] = None
+outbox_relay = OutboxRelay(batch_size=config.outbox_batch_size, poll_interval=config.outbox_poll_interval)
+loop_monitor: Optional[asyncio.Task] = None
+outbox_monitor: Optional[asyncio.Task] = None
+active_refresh_task: Optional[asyncio.Task] = None
+outbox_backlog = 0
+expired_published = metrics.counter("events_expired_total", "Events whose deadline passed while unfinished")
+
+
+async def publish_expired(event_ids: list[int]):
+    # Дедлайны отслеживает каждый процесс, а уведомление о закрытии публикует только лидер
+    if not leader_election.is_leader:
+        return
+    events = await Event.filter(id__in=event_ids, status=EventStatus.unfinished)
+    if events:
+        await OutboxMessage.bulk_create([catalogue_message(event, "event.expired") for event in events])
+        expired_published.inc(len(events))
+        outbox_relay.notify()
+        logger.info("Published expiry of %s events", len(events))
+
+
+def active_event_out(event: ActiveEvent) -> dict:
+    return {
+        "id": event.id,
+        "coefficient": event.coefficient,
+        "deadline": datetime.fromtimestamp(event.deadline, tz=timezone.utc),
+        "version": event.version
+    }
+
+
+def stream_change(kind: str, event_id: int, event: Optional[ActiveEvent]):
+    # Поток строится из состояния планировщика, которое каждый процесс ведёт по своим запросам и каталогу
+    stream_hub.publish(kind, active_event_out(event) if event is not None else {"id": event_id})
+
+
+stream_hub = StreamHub(queue_size=config.stream_queue_size, keepalive=config.stream_keepalive)
+deadline_scheduler = DeadlineScheduler(on_expired=publish_expired, on_change=stream_change)
+metrics.gauge("active_events", "Unfinished events with a future deadline held in memory",
+              callback=lambda: len(deadline_scheduler.active))
+
+
+async def start_background_tasks():
+    # Аргументы совпадают с объявлением в bet_maker, иначе RabbitMQ откажет в повторном объявлении
+    await channel.declare_queue("event_status_updates", durable=True, arguments={
+        "x-dead-letter-exchange": config.status_dead_letter_exchange,
+    })
+    catalogue_exchange = await channel.declare_exchange(
+        config.catalogue_exchange, aio_pika.ExchangeType.TOPIC, durable=True
+    )
+    await outbox_relay.start({"": channel.default_exchange, config.catalogue_exchange: catalogue_exchange})
+
+
+async def stop_background_tasks():
+    await outbox_relay.stop()
+
+
+# Ретранслятор outbox и публикация истёкших дедлайнов работают в единственном процессе,
+# остальные воркеры только пишут в outbox и подхватываются по poll_interval
+leader_election = LeaderElection(
+    "line_provider_background",
+    on_elected=start_background_tasks,
+    on_demoted=stop_background_tasks,
+    retry_interval=config.leader_retry_interval
+)
+metrics.gauge("is_leader", "Whether this process runs the singleton background tasks",
+              callback=lambda: int(leader_election.is_leader))
+
+
+async def monitor_outbox():
+    global outbox_backlog
+    while True:
+        try:
+            outbox_backlog = await OutboxMessage.all().count()
+        except Exception as e:
+            logger.warning("Failed to count outbox backlog: %s", e)
+        await asyncio.sleep(config.outbox_monitor_interval)
+
+
+async def process_catalogue_message(message: aio_pika.IncomingMessage):
+    # Изменения, сделанные другими воркерами, приходят через собственный каталог
+    payload = json.loads(message.body)
+    if message.routing_key == "event.expired":
+        deadline_scheduler.discard(payload["event_id"])
+        return
+    deadline_scheduler.update(
+        payload["event_id"],
+        Decimal(str(payload["coefficient"])),
+        datetime.fromisoformat(payload["deadline"]),
+        EventStatus(payload["status"]),
+        payload["version"]
+    )
+
+
+async def refresh_active_events():
+    while True:
+        await asyncio.sleep(config.active_events_refresh_interval)
+        try:
+            await deadline_scheduler.load()
+        except Exception as e:
+            logger.error("Failed to reload active events: %s", e)
 
 
 async def startup():
-    global connection, channel
+    global connection, channel, outbox_monitor, active_refresh_task
     connection = await aio_pika.connect_robust(f"amqp://{config.mq_user}:{config.mq_pwd}@{config.mq_host}/")
-    channel = await connection.channel()
-    await channel.declare_queue("event_status_updates", durable=True)
+    channel = await connection.channel(publisher_confirms=True)
+    outbox_monitor = asyncio.create_task(monitor_outbox())
+    await deadline_scheduler.load()
+    catalogue_exchange = await channel.declare_exchange(
+        config.catalogue_exchange, aio_pika.ExchangeType.TOPIC, durable=True
+    )
+    catalogue_queue = await channel.declare_queue(exclusive=True)
+    await catalogue_queue.bind(catalogue_exchange, routing_key="event.*")
+    await catalogue_queue.consume(process_catalogue_message, no_ack=True)
+    await deadline_scheduler.start()
+    active_refresh_task = asyncio.create_task(refresh_active_events())
+    if config.role != "api":
+        await leader_election.start()
 
 
 async def shutdown():
     global connection
+    await leader_election.stop()
+    await deadline_scheduler.stop()
+    for task in (outbox_monitor, active_refresh_task):
+        if task:
+            task.cancel()
     if connection:
         await connection.close()
         print("Closed RabbitMQ connection")
 
 
+async def warm_pool():
+    # Открываем соединения пула заранее, чтобы первые запросы после деплоя не ждали подключения
+    started = time.perf_counter()
+    client = connections.get("default")
+    await client.execute_query("SELECT 1")
+    await asyncio.gather(*(client.execute_query("SELECT 1") for _ in range(config.db_pool_warm - 1)))
+    logger.info("Warmed %s DB connections in %.3fs", config.db_pool_warm, time.perf_counter() - started)
+
+
+async def check_rabbitmq():
+    return check_channel(channel)
+
+
+async def check_outbox():
+    overloaded = config.admission_outbox_backlog and outbox_backlog >= config.admission_outbox_backlog
+    return DEGRADED if overloaded else OK, {"backlog": outbox_backlog, "leader": leader_election.is_leader}
+
+
+def overload(scope: dict) -> Optional[str]:
+    if config.admission_db_waiters and metrics.db_in_flight - config.db_pool_max >= config.admission_db_waiters:
+        return "db_pool"
+    # Неопубликованный outbox растёт только от записей, чтение продолжаем обслуживать
+    if (scope["method"] != "GET" and config.admission_outbox_backlog
+            and outbox_backlog >= config.admission_outbox_backlog):
+        return "outbox_backlog"
+    return None
+
+
+health = HealthChecks(timeout=config.health_check_timeout)
+health.add("database", check_database)
+health.add("rabbitmq", check_rabbitmq)
+health.add("outbox", check_outbox)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global loop_monitor
     await Tortoise.init(config=TORTOISE_ORM)
-    await Tortoise.generate_schemas()
+    instrument_tortoise()
+    await warm_pool()
+    await ensure_version_counter()
+    loop_monitor = asyncio.create_task(monitor_event_loop(config.loop_monitor_interval))
     await startup()
-    logger.info(f'Database initiated')
+    logger.info("Started in %s role", config.role)
     yield
     await shutdown()
+    loop_monitor.cancel()
     await Tortoise.close_connections()
 
 
 app = FastAPI(title="Line Provider", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware, overload=overload, retry_after=config.admission_retry_after)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+app.add_route("/health/live", live, include_in_schema=False)
+app.add_route("/health/ready", ready_endpoint(health), include_in_schema=False)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    logger.error(f"HTTPException: {str(exc.detail)}")
+    logger.error("HTTPException: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -93,7 +274,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"RequestValidationError: {str(exc.errors())}")
+    logger.error("RequestValidationError: %s", exc.errors())
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors()}
@@ -102,7 +283,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {str(exc)}")
+    logger.error("Unhandled exception: %s", exc)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Internal Server Error"}
@@ -111,14 +292,20 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 @app.post("/events/", response_model=EventOut)
 async def create_event(event: EventIn):
-    logger.debug(f"Received request to create event: {event.json()}")
+    logger.debug("Received request to create event: %s", event)
     event_obj = Event(
         coefficient=event.coefficient,
         deadline=event.deadline,
         status=event.status
     )
-    await event_obj.save()
-    logger.info(f"Event created with ID: {event_obj.id}")
+    async with in_transaction():
+        event_obj.version = await next_version()
+        await event_obj.save()
+        await odds_record(event_obj).save()
+        await catalogue_message(event_obj, "event.created").save()
+    deadline_scheduler.update_event(event_obj)
+    outbox_relay.notify()
+    logger.info("Event created with ID: %s", event_obj.id)
     return EventOut(
         id=event_obj.id,
         coefficient=event_obj.coefficient,
@@ -128,37 +315,69 @@ async def create_event(event: EventIn):
 
 
 @app.get("/events/", response_model=list[EventOut])
-async def get_events():
+async def get_events(
+        after: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        event_status: Optional[EventStatus] = Query(None, alias="status"),
+        stream: bool = False
+):
     logger.debug("Received request to get all events")
-    events = await Event.all()
-    logger.info(f"Retrieved {len(events)} events")
-    return [
-        EventOut(
-            id=event.id,
-            coefficient=event.coefficient,
-            deadline=event.deadline,
-            status=event.status
-        ) for event in events
-    ]
+    queryset = Event.all()
+    if event_status is not None:
+        queryset = queryset.filter(status=event_status)
+    fields = ("id", "coefficient", "deadline", "status")
+    if stream:
+        return ndjson_response(iter_chunks(queryset, fields, after=after))
+    events = await after_cursor(queryset, after).limit(limit).values(*fields)
+    logger.info("Retrieved %s events", len(events))
+    return rows_response(events, limit)
 
 
 @app.get("/actual_events/", response_model=list[EventBasicOut])
 async def get_actual_events():
     logger.debug("Received request to get all events with active deadlines")
+    events = deadline_scheduler.events()
+    logger.info("Retrieved %s active events", len(events))
+    return rows_response([{"id": event.id, "coefficient": event.coefficient} for event in events])
+
+
+@app.get("/events/changes", response_model=EventChangesOut)
+async def get_event_changes(
+        since: int = Query(0, ge=0),
+        limit: int = Query(1000, ge=1, le=5000),
+        expired_since: Optional[datetime] = None
+):
+    logger.debug("Received request to get event changes since version %s", since)
     current_time = datetime.utcnow()
-    events = await Event.filter(deadline__gt=current_time, status=EventStatus.unfinished)
-    logger.info(f"Retrieved {len(events)} active events")
-    return [
-        EventBasicOut(
-            id=event.id,
-            coefficient=event.coefficient
-        ) for event in events
-    ]
+    events = await Event.filter(version__gt=since).order_by("version").limit(limit).values(
+        "id", "coefficient", "deadline", "status", "version"
+    )
+    expired = []
+    if expired_since is not None:
+        expired = await Event.filter(
+            status=EventStatus.unfinished,
+            deadline__gt=expired_since,
+            deadline__lte=current_time
+        ).values_list("id", flat=True)
+    logger.info("Retrieved %s changed and %s expired events since version %s", len(events), len(expired), since)
+    return FastJSONResponse({
+        "cursor": events[-1]["version"] if events else since,
+        "server_time": current_time.replace(tzinfo=timezone.utc),
+        "has_more": len(events) == limit,
+        "changed": events,
+        "expired": expired
+    })
+
+
+@app.get("/events/stream")
+async def stream_events():
+    logger.debug("Received request to stream active events")
+    return stream_hub.response(lambda: {"events": [active_event_out(event) for event in deadline_scheduler.events()]})
 
 
 @app.get("/events/{event_id}", response_model=EventOut)
 async def get_event(event_id: int):
-    logger.debug(f"Received request to get event with ID: {event_id}")
+    logger.debug("Received request to get event with ID: %s", event_id)
     event = await Event.get(id=event_id)
     return EventOut(
         id=event.id,
@@ -170,12 +389,16 @@ async def get_event(event_id: int):
 
 @app.put("/events/{event_id}/status", response_model=EventOut)
 async def update_event_status(event_id: int, status_update: StatusUpdate):
-    logger.debug(f"Received request to update status of event with ID: {event_id} to {status_update.status}")
-    event = await Event.get(id=event_id)
-    event.status = status_update.status
-    await event.save()
-    logger.info(f"Event status updated for ID: {event_id}")
-    await send_event_update(event_id, status_update.status)
+    logger.debug("Received request to update status of event with ID: %s to %s", event_id, status_update.status)
+    async with in_transaction():
+        event = await Event.get(id=event_id)
+        event.status = status_update.status
+        event.version = await next_version()
+        await event.save()
+        await send_event_updates([event])
+    deadline_scheduler.update_event(event)
+    outbox_relay.notify()
+    logger.info("Event status updated for ID: %s", event_id)
     return EventOut(
         id=event.id,
         coefficient=event.coefficient,
@@ -184,13 +407,153 @@ async def update_event_status(event_id: int, status_update: StatusUpdate):
     )
 
 
-async def send_event_update(event_id: int, status: EventStatus):
-    message = json.dumps({"event_id": event_id, "status": status.value})
-    await channel.default_exchange.publish(
-        aio_pika.Message(body=message.encode()),
-        routing_key="event_status_updates",
+@app.put("/events/{event_id}/coefficient", response_model=EventOut)
+async def update_event_coefficient(event_id: int, coefficient_update: CoefficientUpdate):
+    logger.debug("Received request to update coefficient of event with ID: %s to %s",
+                 event_id, coefficient_update.coefficient)
+    async with in_transaction():
+        event = await Event.get(id=event_id)
+        event.coefficient = coefficient_update.coefficient
+        event.version = await next_version()
+        await event.save()
+        await odds_record(event).save()
+        await catalogue_message(event, "event.updated").save()
+    deadline_scheduler.update_event(event)
+    outbox_relay.notify()
+    logger.info("Event coefficient updated for ID: %s", event_id)
+    return EventOut(
+        id=event.id,
+        coefficient=event.coefficient,
+        deadline=event.deadline,
+        status=event.status
     )
 
 
+@app.get("/events/{event_id}/odds_history", response_model=list[OddsPoint])
+async def get_odds_history(
+        event_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        bucket: Optional[int] = Query(None, ge=1, description="Downsampling bucket size in seconds")
+):
+    logger.debug("Received request to get odds history of event with ID: %s", event_id)
+    queryset = OddsHistory.filter(event_id=event_id)
+    if since is not None:
+        queryset = queryset.filter(ts__gte=epoch_ms(since))
+    if until is not None:
+        queryset = queryset.filter(ts__lt=epoch_ms(until))
+    if bucket is None:
+        rows = await queryset.order_by("ts", "id").values_list("ts", "coefficient")
+        points = [(ts, coefficient, coefficient, coefficient) for ts, coefficient in rows]
+        changes = len(rows)
+    else:
+        # Корзины считаются в базе: из каждой приходят минимум, максимум и id последнего изменения,
+        # журнал только дописывается, поэтому последнее изменение - с наибольшим id
+        bucket_ms = bucket * 1000
+        if OddsHistory._meta.db.capabilities.dialect == "mysql":
+            bucket_sql = f"`ts` DIV {bucket_ms}"
+        else:
+            bucket_sql = f'"ts" / {bucket_ms}'
+        buckets = await queryset.annotate(
+            bucket=RawSQL(bucket_sql),
+            low=Min("coefficient"),
+            high=Max("coefficient"),
+            last_id=Max("id"),
+            changes=Count("id")
+        ).group_by("bucket").order_by("bucket").values("bucket", "low", "high", "last_id", "changes")
+        last = dict(await OddsHistory.filter(
+            id__in=[row["last_id"] for row in buckets]
+        ).values_list("id", "coefficient"))
+        points = [
+            (row["bucket"] * bucket_ms, last[row["last_id"]], row["low"], row["high"]) for row in buckets
+        ]
+        changes = sum(row["changes"] for row in buckets)
+    logger.info("Retrieved %s odds changes as %s points for event ID: %s", changes, len(points), event_id)
+    return [
+        OddsPoint(
+            ts=datetime.fromtimestamp(bucket_start / 1000, tz=timezone.utc),
+            coefficient=coefficient,
+            low=low,
+            high=high
+        ) for bucket_start, coefficient, low, high in points
+    ]
+
+
+@app.put("/events/status", response_model=list[EventOut])
+async def update_events_status(status_updates: list[EventStatusUpdate] = Body(..., min_items=1, max_items=1000)):
+    logger.debug("Received request to update status of %s events", len(status_updates))
+    new_statuses = {status_update.id: status_update.status for status_update in status_updates}
+    async with in_transaction():
+        events = await Event.filter(id__in=list(new_statuses))
+        missing = set(new_statuses) - {event.id for event in events}
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Events not found: {sorted(missing)}")
+        first_version = await next_version(len(events)) - len(events) + 1
+        for offset, event in enumerate(events):
+            event.status = new_statuses[event.id]
+            event.version = first_version + offset
+            await event.save(update_fields=["status", "version"])
+        await send_event_updates(events)
+    for event in events:
+        deadline_scheduler.update_event(event)
+    outbox_relay.notify()
+    logger.info("Event status updated for %s events", len(events))
+    return [
+        EventOut(
+            id=event.id,
+            coefficient=event.coefficient,
+            deadline=event.deadline,
+            status=event.status
+        ) for event in events
+    ]
+
+
+def catalogue_message(event: Event, routing_key: str) -> OutboxMessage:
+    deadline = event.deadline if event.deadline.tzinfo else event.deadline.replace(tzinfo=timezone.utc)
+    return OutboxMessage(
+        exchange=config.catalogue_exchange,
+        routing_key=routing_key,
+        payload={
+            "event_id": event.id,
+            "coefficient": float(event.coefficient),
+            "deadline": deadline.isoformat(),
+            "status": event.status.value,
+            "version": event.version
+        }
+    )
+
+
+async def send_event_updates(events: list[Event]):
+    await OutboxMessage.bulk_create([
+        OutboxMessage(routing_key="event_status_updates", payload={
+            "event_id": event.id, "status": event.status.value, "version": event.version
+        })
+        for event in events
+    ] + [catalogue_message(event, "event.updated") for event in events])
+
+
+async def init_schemas():
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    await Tortoise.close_connections()
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host='0.0.0.0', port=8001, log_level="debug", log_config=uvicorn_log_config)
+    parser = argparse.ArgumentParser(description="Line Provider")
+    parser.add_argument("--role", choices=("all", "api", "worker"), default=config.role,
+                        help="api serves HTTP only, worker publishes the outbox and expiries under leader election, "
+                             "all does both")
+    parser.add_argument("--workers", type=int, default=config.workers, help="Number of HTTP worker processes")
+    args = parser.parse_args()
+    # Воркеры uvicorn импортируют main заново, роль передаётся им через окружение
+    os.environ["ROLE"] = config.role = args.role
+    if config.generate_schemas:
+        asyncio.run(init_schemas())
+    uvicorn.run(
+        app if args.workers == 1 or args.role == "worker" else "main:app",
+        host='0.0.0.0',
+        port=config.port,
+        workers=args.workers if args.role != "worker" else 1,
+        log_level=level.lower(),
+        log_config=uvicorn_log_config
+    )
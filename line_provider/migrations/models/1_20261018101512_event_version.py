@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `event` ADD `version` BIGINT NOT NULL  DEFAULT 0;
+        UPDATE `event` SET `version` = `id`;
+        ALTER TABLE `event` ADD INDEX `idx_event_version_d084d7` (`version`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `event` DROP INDEX `idx_event_version_d084d7`;
+        ALTER TABLE `event` DROP COLUMN `version`;"""
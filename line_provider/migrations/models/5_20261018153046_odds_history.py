@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `odds_history` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `event_id` INT NOT NULL,
+    `ts` BIGINT NOT NULL,
+    `coefficient` DECIMAL(5,2) NOT NULL,
+    KEY `idx_odds_histor_event_i_9f6395` (`event_id`, `ts`)
+) CHARACTER SET utf8mb4 ROW_FORMAT=COMPRESSED;
+        INSERT INTO `odds_history` (`event_id`, `ts`, `coefficient`)
+    SELECT `id`, CAST(UNIX_TIMESTAMP(NOW(3)) * 1000 AS SIGNED), `coefficient` FROM `event`;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `odds_history`;"""
@@ -0,0 +1,16 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `version_counter` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `value` BIGINT NOT NULL  DEFAULT 0
+) CHARACTER SET utf8mb4;
+        INSERT INTO `version_counter` (`id`, `value`)
+    SELECT 1, COALESCE(MAX(`version`), 0) FROM `event`;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `version_counter`;"""
@@ -1,7 +1,10 @@
 from tortoise import fields, models
+from tortoise.expressions import F
+from tortoise.functions import Max
 from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
+import time
 
 
 logger = logging.getLogger(__name__)
@@ -19,7 +22,65 @@ class Event(models.Model):
     coefficient = fields.DecimalField(max_digits=5, decimal_places=2)
     deadline = fields.DatetimeField()
     status = fields.CharEnumField(EventStatus, max_length=50)
+    version = fields.BigIntField(default=0, index=True)
 
     class Meta:
         table = "event"
+        indexes = (("status", "deadline"),)
 
+
+class VersionCounter(models.Model):
+    # Единственная строка со счётчиком версий изменений событий
+    id = fields.IntField(pk=True)
+    value = fields.BigIntField(default=0)
+
+    class Meta:
+        table = "version_counter"
+
+
+async def next_version(count: int = 1) -> int:
+    # Вызывается внутри транзакции записи: блокировка строки счётчика держится до коммита, поэтому версии
+    # фиксируются строго по порядку и курсор ленты изменений не может обогнать незакоммиченную запись.
+    # Возвращает последнюю из count выделенных версий
+    await VersionCounter.filter(id=1).update(value=F("value") + count)
+    return await VersionCounter.filter(id=1).first().values_list("value", flat=True)
+
+
+async def ensure_version_counter():
+    # Счётчик продолжает уже выданные версии событий
+    if not await VersionCounter.exists(id=1):
+        last = await Event.all().annotate(last=Max("version")).first().values_list("last", flat=True)
+        await VersionCounter.get_or_create(id=1, defaults={"value": last or 0})
+
+
+class OutboxMessage(models.Model):
+    id = fields.BigIntField(pk=True)
+    exchange = fields.CharField(max_length=255, default="")
+    routing_key = fields.CharField(max_length=255)
+    payload = fields.JSONField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "outbox"
+
+
+class OddsHistory(models.Model):
+    # Журнал только на добавление: время хранится в миллисекундах эпохи, коэффициент как DECIMAL(5,2)
+    id = fields.BigIntField(pk=True)
+    event_id = fields.IntField()
+    ts = fields.BigIntField()
+    coefficient = fields.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        table = "odds_history"
+        indexes = (("event_id", "ts"),)
+
+
+def epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def odds_record(event: Event) -> OddsHistory:
+    return OddsHistory(event_id=event.id, ts=time.time_ns() // 1_000_000, coefficient=event.coefficient)
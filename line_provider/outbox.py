@@ -0,0 +1,89 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+import aio_pika
+
+import metrics
+from models import OutboxMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    def __init__(self, batch_size: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.exchanges: dict[str, aio_pika.Exchange] = {}
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.stopping = False
+
+    async def start(self, exchanges: dict[str, aio_pika.Exchange]):
+        self.exchanges = exchanges
+        self.stopping = False
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.stopping = True
+            self.wakeup.set()
+            await self.task
+            self.task = None
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                while await self.relay_batch() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error("Failed to relay outbox messages: %s", e)
+
+    async def relay_batch(self) -> int:
+        messages = await OutboxMessage.all().order_by("id").limit(self.batch_size)
+        if not messages:
+            return 0
+        acked = await self.publish_many(messages)
+        if acked:
+            await OutboxMessage.filter(id__in=acked).delete()
+        # Если часть пакета не подтверждена, остаток повторяется на следующем проходе
+        return len(acked) if len(acked) == len(messages) else 0
+
+    async def publish_many(self, messages: list[OutboxMessage]) -> list[int]:
+        # Публикации отправляются конвейером, каждая ждёт подтверждения брокера
+        results = await asyncio.gather(*(self.publish(message) for message in messages), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            logger.error("Failed to publish %s of %s outbox messages: %s", len(errors), len(messages), errors[0])
+        else:
+            logger.debug("Published %s outbox messages", len(messages))
+        return [message.id for message, result in zip(messages, results) if not isinstance(result, BaseException)]
+
+    async def publish(self, message: OutboxMessage):
+        started = time.perf_counter()
+        outcome = "failed"
+        try:
+            await self.exchanges[message.exchange].publish(
+                aio_pika.Message(
+                    body=json.dumps(message.payload).encode(),
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    timestamp=datetime.utcnow()
+                ),
+                routing_key=message.routing_key,
+            )
+            outcome = "ok"
+        finally:
+            metrics.mq_publish_duration.observe(time.perf_counter() - started)
+            metrics.mq_published.inc(exchange=message.exchange, routing_key=message.routing_key, outcome=outcome)
@@ -31,3 +31,41 @@ class EventBasicOut(BaseModel):
 
 class StatusUpdate(BaseModel):
     status: EventStatus
+
+
+class EventChangeOut(BaseModel):
+    id: int
+    coefficient: float
+    deadline: datetime
+    status: EventStatus
+    version: int
+
+
+class EventChangesOut(BaseModel):
+    cursor: int
+    server_time: datetime
+    has_more: bool
+    changed: list[EventChangeOut]
+    expired: list[int]
+
+
+class EventStatusUpdate(BaseModel):
+    id: int
+    status: EventStatus
+
+
+class CoefficientUpdate(BaseModel):
+    coefficient: condecimal(max_digits=5, decimal_places=2)
+
+    @validator('coefficient')
+    def check_amount(cls, value):
+        if value <= 0:
+            raise ValueError('Amount must be greater than 0')
+        return value
+
+
+class OddsPoint(BaseModel):
+    ts: datetime
+    coefficient: float
+    low: float
+    high: float
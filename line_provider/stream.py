@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+import metrics
+from pagination import json_default
+
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE = b": keepalive\n\n"
+DROPPED = b'event: dropped\ndata: {"reason":"slow consumer"}\n\n'
+
+stream_subscribers = metrics.gauge("stream_subscribers", "Connected server-sent event subscribers")
+stream_published = metrics.counter("stream_messages_total", "Updates fanned out to stream subscribers", ("type",))
+stream_dropped = metrics.counter("stream_dropped_total", "Subscribers disconnected for not keeping up")
+
+
+def sse_frame(kind: str, data) -> bytes:
+    return b"event: " + kind.encode() + b"\ndata: " + orjson.dumps(data, default=json_default) + b"\n\n"
+
+
+class StreamHub:
+    def __init__(self, queue_size: int = 1000, keepalive: float = 15):
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.subscribers: set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        stream_subscribers.set(len(self.subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        stream_subscribers.set(len(self.subscribers))
+
+    def publish(self, kind: str, data: dict):
+        if not self.subscribers:
+            return
+        # Кадр кодируется один раз на всех подписчиков
+        frame = sse_frame(kind, data)
+        stream_published.inc(type=kind)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.drop(queue)
+
+    def drop(self, queue: asyncio.Queue):
+        # Медленный клиент не копит очередь: отключаем его, после переподключения он получит свежий снимок
+        self.unsubscribe(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(DROPPED)
+        stream_dropped.inc()
+        logger.warning("Dropped slow stream subscriber")
+
+    async def frames(self, snapshot: Callable[[], dict]) -> AsyncIterator[bytes]:
+        # Подписка и снимок без await между ними, поэтому ни одно обновление не теряется
+        queue = self.subscribe()
+        try:
+            yield sse_frame("snapshot", snapshot())
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                yield frame
+                if frame is DROPPED:
+                    return
+        finally:
+            self.unsubscribe(queue)
+
+    def response(self, snapshot: Callable[[], dict]) -> StreamingResponse:
+        return StreamingResponse(
+            self.frames(snapshot),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
@@ -1,8 +1,30 @@
-from config import db_name, db_user, db_host, db_pass, db_port
+from config import (db_name, db_user, db_host, db_pass, db_port, db_charset, db_pool_min, db_pool_max, db_pool_recycle,
+                    db_connect_timeout, db_statement_timeout)
 
 
+credentials = {
+    "host": db_host,
+    "port": db_port,
+    "user": db_user,
+    "password": db_pass,
+    "database": db_name,
+    "charset": db_charset,
+    "minsize": db_pool_min,
+    "maxsize": db_pool_max,
+    "pool_recycle": db_pool_recycle,
+    "connect_timeout": db_connect_timeout,
+}
+if db_statement_timeout > 0:
+    # max_execution_time ограничивает только SELECT, миграции и записи не прерываются
+    credentials["init_command"] = f"SET SESSION max_execution_time={int(db_statement_timeout * 1000)}"
+
 TORTOISE_ORM = {
-    "connections": {"default": f"mysql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"},
+    "connections": {
+        "default": {
+            "engine": "tortoise.backends.mysql",
+            "credentials": credentials,
+        },
+    },
     "apps": {
         "models": {
             "models": ["models", "aerich.models"],